@@ -0,0 +1,303 @@
+"""Times the hot paths of the racer across population sizes and gene counts.
+
+Run from the root of the repository, no display is needed:
+
+    python benchmarks/bench_hot_paths.py --output results.json
+    python benchmarks/bench_hot_paths.py --sizes 20 200 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+import pymunk as pm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "racer"))
+
+from map_handlers import MapHandler  # noqa: E402
+from physics import PointMassPhysics  # noqa: E402
+from populations import Population  # noqa: E402
+from selections import SELECTIONS  # noqa: E402
+
+MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "track.txt")
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def measure(function, repeats, setup=None):
+    """Calls the function a number of times and times each call.
+
+    Args:
+        function (callable): The function to time. It is called without arguments.
+        repeats (int): The number of times to call it.
+        setup (callable, optional): A function to call without arguments before each call, which is not
+                                    timed. Defaults to None.
+
+    Returns:
+        dict: The best, mean and worst time of a call in seconds.
+    """
+    times = []
+    for i in range(repeats):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return {"best": min(times), "mean": sum(times) / len(times), "worst": max(times)}
+
+
+def build_population(pop_size, num_of_genes, physics=None):
+    map_handler = MapHandler(pm.Space(), MAP_FILE, 10)
+    physics = physics(map_handler) if physics is not None else None
+    return Population(num_of_genes, map_handler, 50, 0.3, pop_size, physics)
+
+
+def fill_path_ranges(population):
+    """Spreads the genes of every car over a random number of checkpoints, as if they had been driven."""
+    num_of_checkpoints = len(population.map_handler.checkpoint_polys)
+
+    for car in population.population:
+        farthest = np.random.randint(1, num_of_checkpoints + 1)
+        bounds = np.linspace(0, car.dna.num_of_points, farthest + 1).astype(int)
+
+        car.dna.farthest_poly_reached = farthest - 1
+        for i in range(num_of_checkpoints):
+            car.dna.path_ranges[i] = (bounds[i], bounds[i + 1]) if i < farthest else (0, 0)
+
+
+def track_positions(population, num_of_positions):
+    """Finds positions on the track around the centre of each checkpoint to look up."""
+    centres = [poly.representative_point() for poly in population.map_handler.checkpoint_polys]
+    picks = np.random.randint(0, len(centres), num_of_positions)
+    return [(int(centres[i].x), int(centres[i].y)) for i in picks]
+
+
+def bench_space_step(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+    population.move_cars()
+    return measure(lambda: population.map_handler.space.step(1 / 100.0), repeats)
+
+
+def bench_point_mass_step(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes, PointMassPhysics)
+    population.move_cars()
+    return measure(lambda: population.physics.step(1 / 100.0), repeats)
+
+
+def bench_next_force(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+
+    def next_forces():
+        for car in population.population:
+            car.next_force()
+
+    return measure(next_forces, min(repeats, num_of_genes))
+
+
+def bench_point_mass_move_cars(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes, PointMassPhysics)
+    return measure(population.move_cars, min(repeats, num_of_genes))
+
+
+def bench_add_to_path_ranges(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+    positions = track_positions(population, pop_size)
+
+    def add_to_path_ranges():
+        for car, pos in zip(population.population, positions):
+            car.dna.add_to_path_ranges(pos, 0)
+
+    return measure(add_to_path_ranges, repeats)
+
+
+def bench_track_paths(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes, PointMassPhysics)
+    moved = population.apply_next_genes()
+    return measure(lambda: population.track_paths(moved), repeats)
+
+
+def bench_find_current_checkpoint(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+    positions = track_positions(population, pop_size)
+
+    def find_checkpoints():
+        for car, pos in zip(population.population, positions):
+            car.dna.find_current_checkpoint(pos)
+
+    return measure(find_checkpoints, repeats)
+
+
+def bench_calculate_fitness(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+    positions = track_positions(population, pop_size)
+
+    def calculate_fitnesses():
+        for car, pos in zip(population.population, positions):
+            car.dna.calculate_fitness(pos)
+
+    return measure(calculate_fitnesses, repeats)
+
+
+def bench_selection(strategy):
+    def bench(pop_size, num_of_genes, repeats):
+        population = build_population(pop_size, num_of_genes)
+        population.selection = SELECTIONS[strategy]()
+        for car, pos in zip(population.population, track_positions(population, pop_size)):
+            car.dna.calculate_fitness(pos)
+
+        def select():
+            population.select()
+            population.selection.sample(2 * pop_size)
+
+        return measure(select, repeats)
+
+    return bench
+
+
+def bench_crossover(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+    fill_path_ranges(population)
+    dnas = [car.dna for car in population.population]
+
+    def crossovers():
+        for i in range(pop_size):
+            dnas[i].crossover(dnas[-i - 1], 0.3)
+
+    return measure(crossovers, repeats)
+
+
+def bench_population_crossover(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+
+    def score():
+        # Crossover clears the path ranges and replaces the Dna, so every generation is driven again
+        fill_path_ranges(population)
+        for car, pos in zip(population.population, track_positions(population, pop_size)):
+            car.dna.calculate_fitness(pos)
+        population.select()
+
+    return measure(population.crossover, repeats, setup=score)
+
+
+def bench_mutate(pop_size, num_of_genes, repeats):
+    population = build_population(pop_size, num_of_genes)
+    dnas = [car.dna for car in population.population]
+
+    def mutations():
+        for dna in dnas:
+            dna.mutate(dna.genes, 1)
+
+    return measure(mutations, repeats)
+
+
+def bench_map_handler(pop_size, num_of_genes, repeats):
+    return measure(lambda: MapHandler(pm.Space(), MAP_FILE, 10), repeats)
+
+
+BENCHMARKS = {
+    "space.step": bench_space_step,
+    "PointMassPhysics.step": bench_point_mass_step,
+    "Car.next_force": bench_next_force,
+    "Population.move_cars[point_mass]": bench_point_mass_move_cars,
+    "Dna.add_to_path_ranges": bench_add_to_path_ranges,
+    "Population.track_paths": bench_track_paths,
+    "Dna.find_current_checkpoint": bench_find_current_checkpoint,
+    "Dna.calculate_fitness": bench_calculate_fitness,
+    "Dna.crossover": bench_crossover,
+    "Population.crossover": bench_population_crossover,
+    "Dna.mutate": bench_mutate,
+    "MapHandler": bench_map_handler
+}
+for strategy in SELECTIONS:
+    BENCHMARKS["Population.select[" + strategy + "]"] = bench_selection(strategy)
+
+# These don't depend on the population, so they are only run once
+SIZE_INDEPENDENT = {"MapHandler"}
+
+# The largest populations these can run with. Every car starts stacked at the start point, and the pymunk
+# broadphase still visits every pair of them, so larger ones take minutes per step and gigabytes of memory.
+MAX_SIZES = {"space.step": 5000}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Times the hot paths of the racer.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000, 20000],
+                        help="The population sizes to time.")
+    parser.add_argument("--genes", type=int, nargs="+", default=[150, 1500],
+                        help="The gene counts to time.")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="The number of times to call each benchmark.")
+    parser.add_argument("--only", type=str, nargs="+", choices=BENCHMARKS.keys(), default=list(BENCHMARKS),
+                        help="Only run these benchmarks.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="The seed of the random generators, set before each benchmark.")
+    parser.add_argument("--output", type=str, default="bench_results.json",
+                        help="The JSON file to write the results to.")
+    parser.add_argument("--compare", type=str,
+                        help="A JSON file of an earlier run to compare the results with.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    results = []
+    for name in args.only:
+        cases = [(0, 0)] if name in SIZE_INDEPENDENT else \
+            [(pop_size, num_of_genes) for pop_size in args.sizes for num_of_genes in args.genes]
+
+        for pop_size, num_of_genes in cases:
+            if pop_size > MAX_SIZES.get(name, pop_size):
+                print(f"{name:40} pop {pop_size:6} genes {num_of_genes:5}   skipped, more than {MAX_SIZES[name]} cars")
+                continue
+
+            seed_everything(args.seed)
+            timing = BENCHMARKS[name](pop_size, num_of_genes, args.repeats)
+            results.append(dict(benchmark=name, pop_size=pop_size, num_of_genes=num_of_genes, **timing))
+
+            print(f"{name:40} pop {pop_size:6} genes {num_of_genes:5}   best {timing['best'] * 1000:10.3f} ms")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pymunk": pm.version,
+            "machine": platform.machine(),
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+def compare(results, earlier_file):
+    """Prints how much faster or slower each benchmark got since an earlier run."""
+    with open(earlier_file) as file:
+        earlier = {(r["benchmark"], r["pop_size"], r["num_of_genes"]): r for r in json.load(file)["results"]}
+
+    print("\nCompared with " + earlier_file)
+    for result in results:
+        before = earlier.get((result["benchmark"], result["pop_size"], result["num_of_genes"]))
+        if before is not None:
+            speedup = before["best"] / result["best"] if result["best"] > 0 else float("inf")
+            print(f"{result['benchmark']:40} pop {result['pop_size']:6} genes {result['num_of_genes']:5}   "
+                  f"x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,11 @@
-from p5 import *
 import pymunk
 from dnas import Dna
-
-collision_types = {
-    "car": 1,
-    "wall": 2,
-    "finish_line": 3
-}
+from physics import car_filter, collision_types, PymunkPhysics
 
 
 class Car:
 
-    def __init__(self, map_handler, start_point, num_of_genes, end_spread, id, dna=None):
+    def __init__(self, map_handler, start_point, num_of_genes, end_spread, id, dna=None, physics=None):
         """Creates a new car with either a given or a new Dna.
 
         Args:
@@ -21,30 +15,30 @@ class Car:
             end_spread (int): The number of genes to remove and replace from the end of the gene list.
             id (int): Car id.
             dna (Dna obj, optional): Object used to coordinate the evolution process. Defaults to None.
+            physics (PymunkPhysics or PointMassPhysics obj, optional): The physics backend moving the car.
+                                                                      Defaults to pymunk in the map's space.
         """
         self.space = map_handler.space
         self.end_spread = end_spread
         self.finished = False
         self.is_dead = False
+        self.stalled = False
         self.id = id
 
+        # The triangle the car is drawn as, replaced by the pymunk shape's points when it has one
+        self.points = [(-8, -8), (0, 8), (8, -8)]
+
         if dna is None:
-            self.dna = Dna(map_handler.checkpoint_polys, num_of_genes, id=id)
+            self.dna = Dna(map_handler.checkpoint_polys, num_of_genes, id=id,
+                           checkpoint_index=map_handler.checkpoint_index)
         else:
             self.dna = dna
             self.dna.id = self.id
 
-        self.add_new_car_to_space(start_point)
-        self.add_collision_handlers()
-
-    def add_collision_handlers(self):
-        """Adds collision handlers for touching walls and reaching the finish line to the car.
-        """
-        handler_wall = self.space.add_collision_handler(collision_types["car"], collision_types["wall"])
-        handler_wall.begin = self.touched_wall
+        if physics is None:
+            physics = PymunkPhysics(map_handler)
 
-        handler_fin = self.space.add_collision_handler(collision_types["car"], collision_types["finish_line"])
-        handler_fin.begin = self.reached_finish
+        physics.add_car(self, start_point)
 
     def add_new_car_to_space(self, start_point, width=16, height=16, mass=1):
         """Creates a car body with a shape, based on the arguments and adds them to the pymunk physics space.
@@ -62,107 +56,99 @@ class Car:
         self.body = pymunk.Body(mass, moment)
         self.body.position = start_point[0], start_point[1]
 
-        shape = pymunk.Poly(self.body, self.points)
-        shape.friction = 0.5
-        shape.sensor = True
-        shape.collision_type = collision_types["car"]
+        self.shape = pymunk.Poly(self.body, self.points)
+        self.shape.friction = 0.5
+        self.shape.sensor = True
+        self.shape.collision_type = collision_types["car"]
+        self.shape.filter = car_filter
 
-        self.space.add(self.body, shape)
+        self.space.add(self.body, self.shape)
 
-    # If the car touches the wall, it's dead and no longer moves in the lifecycle
-    def touched_wall(self, arbiter, space, data):
-        """A car handler method that gets called when a car touches the wall.
-        This removes the car from the space and marks it as "dead" (inactive).
+    def reset(self, dna):
+        """Reuses the car for a new member of the population. The body is put back at the
+        start by the physics backend.
 
         Args:
-            arbiter (pymunk Arbiter abj): The Arbiter object encapsulates a pair of colliding shapes and all of
-                                    the data about their collision.
-            space (pymunk Space obj): Space describes the physics simulation space
-            data (pymunk Data obj): Some extra data from the collision
-
-        Returns:
-            bool: Tells the pymunk to handle the collision normally
+            dna (Dna obj): The Dna of the new member.
         """
-        car_body = arbiter.shapes[0].body
-
-        if self.body.position == car_body.position:
-            self.is_dead = True
-
-            # removes the specified amount of genes from the path list to
-            # make the car possibly not hit the wall next time
-            self.dna.remove_from_path_list(self.end_spread)
-
-        space.remove(car_body)
-        return True
+        self.finished = False
+        self.is_dead = False
+        self.stalled = False
+        self.dna = dna
+        self.dna.id = self.id
 
-    def reached_finish(self, arbiter, space, data):
-        """A handler method to notify the system that a car has finished
+    def crash(self):
+        """Marks the car as dead after it touched a wall."""
+        self.is_dead = True
 
-        Args:
-            arbiter (pymunk Arbiter abj): The Arbiter object encapsulates a pair of colliding shapes and all of
-                                    the data about their collision.
-            space (pymunk Space obj): Space describes the physics simulation space
-            data (pymunk Data obj): Some extra data from the collision
+        # removes the specified amount of genes from the path ranges to
+        # make the car possibly not hit the wall next time
+        self.dna.remove_from_path_ranges(self.end_spread)
 
-        Returns:
-            bool: Tells the pymunk to handle the collision normally
+    def stall(self):
+        """Marks the car as dead after it stopped making progress. Unlike a crash, this keeps its
+        whole path, as none of its genes led it into a wall.
         """
-        car_body = arbiter.shapes[0].body
+        self.is_dead = True
+        self.stalled = True
 
-        if self.body.position == car_body.position:
-            self.finished = True
-            self.is_dead = True
+    def run_out(self):
+        """Marks the car as dead after it used the last of its genes, which only happens before the end
+        of the generation if it was resumed part of the way along the track.
+        """
+        self.is_dead = True
 
-        space.remove(car_body)
+    def finish(self):
+        """Marks the car as finished after it reached the finish line."""
+        self.finished = True
+        self.is_dead = True
 
         print("\n\nFinished!\n\n")
 
-        return True
-
     def calculate_fitness(self):
         """Calculates the fitness of the car using it's Dna object"""
         pos = (int(self.body.position.x), int(self.body.position.y))
         self.dna.calculate_fitness(pos)
 
-    def display(self):
-        """Draw the car on screen.
-        """
-        pos = self.body.position
-        velocity = self.body.velocity_at_world_point(pos)
-        angle = velocity.angle + (PI * 1.5)
-
-        with push_matrix():
-            # Using the Vector position and float angle to translate and rotate the shape
-            translate(pos.x, pos.y)
-            rotate(angle)
-
-            if self.dna.mutated:
-                fill(255, 100, 100)
-            else:
-                fill(175)
-
-            triangle(self.points[0], self.points[1], self.points[2])
-
     def apply_force(self, force):
-        """Applies a given force Vector obj to the car.
+        """Applies a given force to the car.
 
         Args:
-            force (Vector): A Vector of the force to apply.
+            force (ndarray): The x and y of the force to apply.
         """
 
     # forces:
     # [+, 0] - right; [-, 0] - left
     # [0, +] - down; [0, -] - up
         self.body.apply_force_at_world_point(
-            (force.x, force.y), self.body.position)
+            (float(force[0]), float(force[1])), self.body.position)
 
     def next_force(self):
-        """Moves the car based on its Dna and saves its current position to the path list."""
+        """Moves the car based on its Dna and saves its current position to the path ranges."""
+        if self.apply_next_gene():
+            self.track_path()
+
+    def apply_next_gene(self):
+        """Applies the next gene of the Dna to the car as a force.
+
+        Returns:
+            bool: True if the car is still moving and had a gene left to apply.
+        """
         if not self.is_dead:
             gene = self.dna.next_gene
             if gene is not None:
                 self.apply_force(gene)
+                return True
+
+        return False
 
-                # Used to know which part of the genes were activated in which part of the track
-                pos = (int(self.body.position.x), int(self.body.position.y))
-                self.dna.add_to_path_list(pos, gene)
+    def track_path(self):
+        """Saves the current position of the car to the path ranges, for the gene that was just applied.
+
+        Returns:
+            bool: True if the car got farther than the farthest checkpoint before.
+        """
+
+        # Used to know which part of the genes were activated in which part of the track
+        pos = (int(self.body.position.x), int(self.body.position.y))
+        return self.dna.add_to_path_ranges(pos, self.dna.current_gene)
@@ -0,0 +1,372 @@
+import math
+import numpy as np
+from shapely.geometry import Point
+from shapely.prepared import prep
+
+
+class CheckpointIndex:
+
+    def __init__(self, checkpoint_polys, cell_size=32, compiled_map=None):
+        """Builds a uniform grid over the checkpoint polygons so that only the few polygons
+        overlapping the cell of a position have to be tested when looking it up, caches the
+        geometry needed to measure the distance to the next checkpoint and rasterises the checkpoint
+        and progress of every pixel of the track, so that most positions are looked up in arrays.
+
+        Args:
+            checkpoint_polys (list of Polygon obj): A list of polygons describing the checkpoints in the track.
+            cell_size (int, optional): The width and height of a grid cell in pixels. Defaults to 32.
+            compiled_map (CompiledMap obj, optional): The grid and geometry of the same checkpoints, already
+                                                      built by map_compilers. Defaults to building them.
+        """
+        self.checkpoint_polys = checkpoint_polys
+        self.prepared_polys = [prep(poly) for poly in checkpoint_polys]
+
+        if compiled_map is None:
+            # The corners of each checkpoint quad, in the order of the polygon exterior
+            self.quads = np.array([poly.exterior.coords[:4] for poly in checkpoint_polys],
+                                  dtype=float).reshape(-1, 4, 2)
+            self.cell_size = cell_size
+            self.cells = build_grid(self.quads, cell_size)
+            self.edge_origins, self.edge_normals, self.max_checkpnt_len = checkpoint_geometry(self.quads)
+            self.field_origin, self.field_ids, self.field_overlaps, self.field_progresses = \
+                build_progress_field(self.quads, self.edge_origins, self.edge_normals, self.max_checkpnt_len)
+        else:
+            self.quads = compiled_map.quads
+            self.cell_size = compiled_map.cell_size
+            self.cells = unpack_grid(compiled_map.grid_cells, compiled_map.cell_starts, compiled_map.cell_ids)
+            self.edge_origins = compiled_map.edge_origins
+            self.edge_normals = compiled_map.edge_normals
+            self.max_checkpnt_len = compiled_map.max_checkpnt_len
+
+            # Still mapped from the files, but indexed as plain arrays, which is cheaper on every tick
+            self.field_origin = np.asarray(compiled_map.field_origin)
+            self.field_ids = np.asarray(compiled_map.field_ids)
+            self.field_overlaps = np.asarray(compiled_map.field_overlaps)
+            self.field_progresses = np.asarray(compiled_map.field_progresses)
+
+        self.field_height, self.field_width = self.field_ids.shape
+        self.field_size = np.array([self.field_width, self.field_height])
+
+    def __len__(self):
+        return len(self.checkpoint_polys)
+
+    def cell_of(self, coord):
+        """Finds the column or row of the grid that the coordinate falls in.
+
+        Args:
+            coord (float): An x or y coordinate.
+
+        Returns:
+            int: The column or row of the grid.
+        """
+        return math.floor(coord / self.cell_size)
+
+    def pixel_of(self, pos):
+        """Finds the pixel of the progress field that a position falls in.
+
+        Args:
+            pos (tuple): A tuple of whole x and y coordinates.
+
+        Returns:
+            tuple: The row and column of the pixel, or None if the position is outside the field.
+        """
+        col = int(pos[0]) - int(self.field_origin[0])
+        row = int(pos[1]) - int(self.field_origin[1])
+
+        if 0 <= col < self.field_width and 0 <= row < self.field_height:
+            return row, col
+
+        return None
+
+    def find(self, pos, hint=-1):
+        """Finds the checkpoint polygon that the position is in. It is read from the progress field,
+        unless the position is in more than one polygon. Then the hinted checkpoint and its neighbours
+        are tested first, as a car is almost always in the same or an adjacent checkpoint as on its
+        last tick, before falling back to the polygons in the cell of the position.
+
+        Args:
+            pos (tuple): A tuple of the whole x and y coordinates of the car.
+            hint (int, optional): The ID of the checkpoint the car was last in. Defaults to -1.
+
+        Returns:
+            int: The ID of the checkpoint polygon the position is in, or -1 if it is not in any.
+        """
+        pixel = self.pixel_of(pos)
+
+        if pixel is None:
+            return -1
+
+        if not self.field_overlaps[pixel]:
+            return int(self.field_ids[pixel])
+
+        position = Point(pos)
+
+        if hint != -1:
+            for index in (hint, hint + 1, hint - 1):
+                if 0 <= index < len(self.prepared_polys) and self.prepared_polys[index].contains(position):
+                    return index
+
+        for index in self.cells.get((self.cell_of(pos[0]), self.cell_of(pos[1])), ()):
+            if self.prepared_polys[index].contains(position):
+                return index
+
+        return -1
+
+    def progress(self, pos, checkpoint):
+        """Reads how far along the track a whole position is from the progress field, measuring it
+        instead where checkpoints overlap, as the field only has the progress in the lowest one.
+
+        Args:
+            pos (tuple): A tuple of the whole x and y coordinates of the car.
+            checkpoint (int): The ID of the checkpoint the position was found in by find.
+
+        Returns:
+            float: The number of checkpoints reached plus the part of the current checkpoint covered.
+        """
+        pixel = self.pixel_of(pos)
+
+        if not self.field_overlaps[pixel]:
+            return float(self.field_progresses[pixel])
+
+        return checkpoint + 1 - float(self.dist_to_next_chpt(pos, checkpoint)) / self.max_checkpnt_len
+
+    def pixels_of(self, positions):
+        """Finds the pixels of the progress field that many positions fall in.
+
+        Args:
+            positions (ndarray): A (n, 2) array of whole positions.
+
+        Returns:
+            ndarray: The row of the pixel of each position.
+            ndarray: The column of the pixel of each position.
+            ndarray: Whether each position is inside the field, the rows and columns of the others are 0.
+        """
+        # The columns and rows of both coordinates are found together, as the arrays are small on most ticks
+        pixels = np.asarray(positions, dtype=np.int64) - self.field_origin
+        inside = ((pixels >= 0) & (pixels < self.field_size)).all(axis=1)
+        pixels[~inside] = 0
+
+        return pixels[:, 1], pixels[:, 0], inside
+
+    def find_all(self, positions, hints=None):
+        """Finds the checkpoint polygon of many whole positions at once in the progress field. Like
+        shapely's contains, a position on the border of a polygon is not in it, and the lowest ID
+        wins if polygons overlap, unless hints are given. Then the few positions in more than one
+        polygon are looked up by find from their hint, the same as one at a time.
+
+        Args:
+            positions (ndarray): A (n, 2) array of whole positions.
+            hints (ndarray, optional): The ID of the checkpoint each car was last in, or -1. Defaults to None.
+
+        Returns:
+            ndarray: The ID of the checkpoint polygon of each position, or -1 if it is not in any.
+        """
+        rows, cols, inside = self.pixels_of(positions)
+        ids = np.where(inside, self.field_ids[rows, cols], -1)
+
+        if hints is not None:
+            for k in np.nonzero(inside & self.field_overlaps[rows, cols])[0].tolist():
+                ids[k] = self.find((int(positions[k, 0]), int(positions[k, 1])), int(hints[k]))
+
+        return ids
+
+    def progresses(self, positions):
+        """Reads how far along the track many whole positions are from the progress field, as the
+        number of checkpoints reached plus the part of the current checkpoint covered.
+
+        Args:
+            positions (ndarray): A (n, 2) array of whole positions.
+
+        Returns:
+            ndarray: The progress of each position, or -1 for the positions that are not in any checkpoint.
+        """
+        rows, cols, inside = self.pixels_of(positions)
+        return np.where(inside, self.field_progresses[rows, cols], -1.0)
+
+    def dist_to_next_chpt(self, positions, ids):
+        """Calculates the distance from positions to the line leading to the next checkpoint.
+
+        Args:
+            positions (ndarray): A (n, 2) array of positions, or a single position.
+            ids (ndarray): The ID of the checkpoint polygon of each position, or a single ID.
+
+        Returns:
+            ndarray: The distance of each position.
+        """
+        # |AC x AB| / |AB| where AB is the line and C is the point, which is |AC . n| for the unit normal n
+        to_positions = np.asarray(positions, dtype=float) - self.edge_origins[ids]
+        return np.abs(np.sum(to_positions * self.edge_normals[ids], axis=-1))
+
+
+def locate_in_quads(quads, positions, chunk_size=4096):
+    """Finds the checkpoint polygons of many positions by testing them against every quad. Like
+    shapely's contains, a position on the border of a polygon is not in it.
+
+    Args:
+        quads (ndarray): A (C, 4, 2) array of the corners of each checkpoint.
+        positions (ndarray): A (n, 2) array of positions.
+        chunk_size (int, optional): The number of positions to test against every quad at a time.
+                                    Defaults to 4096.
+
+    Returns:
+        ndarray: The lowest ID of the checkpoint polygons each position is in, or -1 if it is not in any.
+        ndarray: The number of checkpoint polygons each position is in.
+    """
+    ids = np.full(len(positions), -1)
+    counts = np.zeros(len(positions), dtype=np.int64)
+
+    for start in range(0, len(positions), chunk_size):
+        x = positions[start:start + chunk_size, 0][:, None]
+        y = positions[start:start + chunk_size, 1][:, None]
+
+        inside = np.zeros((len(x), len(quads)), dtype=bool)
+        on_border = np.zeros((len(x), len(quads)), dtype=bool)
+
+        # Casts a ray to the right of each position and counts the edges it crosses
+        for corner in range(4):
+            x1, y1 = quads[:, corner - 1, 0], quads[:, corner - 1, 1]
+            x2, y2 = quads[:, corner, 0], quads[:, corner, 1]
+
+            cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+            on_border |= (cross == 0) & (np.minimum(x1, x2) <= x) & (x <= np.maximum(x1, x2)) & \
+                (np.minimum(y1, y2) <= y) & (y <= np.maximum(y1, y2))
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                inside ^= ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+
+        inside &= ~on_border
+        ids[start:start + chunk_size] = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+        counts[start:start + chunk_size] = inside.sum(axis=1)
+
+    return ids, counts
+
+
+def build_progress_field(quads, edge_origins, edge_normals, max_checkpnt_len):
+    """Rasterises the checkpoints at every whole position of their bounding box, which is where the
+    cars are looked up, into the checkpoint each pixel is in and how far along the track it is.
+
+    Args:
+        quads (ndarray): A (C, 4, 2) array of the corners of each checkpoint.
+        edge_origins (ndarray): A (C, 2) array of a point on the line of each checkpoint.
+        edge_normals (ndarray): A (C, 2) array of the unit normal of the line of each checkpoint.
+        max_checkpnt_len (float): The farthest any point of a checkpoint is from its line.
+
+    Returns:
+        ndarray: The (2,) int64 x and y of the pixel in the first column and row.
+        ndarray: A (H, W) int32 array of the lowest ID of the checkpoints each pixel is in, or -1.
+        ndarray: A (H, W) bool array of whether each pixel is in more than one checkpoint.
+        ndarray: A (H, W) float64 array of the progress of each pixel, or -1 if it is in no checkpoint.
+    """
+    if len(quads) == 0:
+        return np.zeros(2, dtype=np.int64), np.full((0, 0), -1, dtype=np.int32), np.zeros((0, 0), dtype=bool), \
+            np.full((0, 0), -1.0)
+
+    origin = np.floor(quads.reshape(-1, 2).min(axis=0)).astype(np.int64)
+    width, height = np.floor(quads.reshape(-1, 2).max(axis=0)).astype(np.int64) - origin + 1
+
+    ids = np.full((height, width), -1, dtype=np.int32)
+    counts = np.zeros((height, width), dtype=np.int32)
+
+    # Each quad is only tested at the pixels of its own bounding box, in order, so the lowest ID is kept
+    for index, quad in enumerate(quads):
+        min_x, min_y = np.floor(quad.min(axis=0)).astype(np.int64)
+        max_x, max_y = np.floor(quad.max(axis=0)).astype(np.int64)
+
+        xs, ys = np.meshgrid(np.arange(min_x, max_x + 1), np.arange(min_y, max_y + 1))
+        inside = locate_in_quads(quad[None], np.stack((xs.ravel(), ys.ravel()), axis=1).astype(float))[0] == 0
+
+        rows, cols = ys.ravel()[inside] - origin[1], xs.ravel()[inside] - origin[0]
+        ids[rows, cols] = np.where(ids[rows, cols] == -1, index, ids[rows, cols])
+        counts[rows, cols] += 1
+
+    # The same sums as measuring the distance to the next checkpoint of each position one at a time
+    rows, cols = np.nonzero(ids != -1)
+    checkpoints = ids[rows, cols]
+    to_positions = np.stack((cols + origin[0], rows + origin[1]), axis=1).astype(float) - edge_origins[checkpoints]
+    dists_to_next_chpt = np.abs(np.sum(to_positions * edge_normals[checkpoints], axis=-1))
+
+    progresses = np.full((height, width), -1.0)
+    progresses[rows, cols] = checkpoints + 1 - dists_to_next_chpt / max_checkpnt_len
+
+    return origin, ids, counts > 1, progresses
+
+
+def build_grid(quads, cell_size):
+    """Lists the checkpoints whose bounding box overlaps each cell of a uniform grid.
+
+    Args:
+        quads (ndarray): A (C, 4, 2) array of the corners of each checkpoint.
+        cell_size (int): The width and height of a grid cell in pixels.
+
+    Returns:
+        dict: The IDs of the checkpoints in each (column, row) cell, sorted.
+    """
+    cells = {}
+
+    for index, quad in enumerate(quads):
+        min_col, min_row = np.floor(quad.min(axis=0) / cell_size).astype(int)
+        max_col, max_row = np.floor(quad.max(axis=0) / cell_size).astype(int)
+
+        for col in range(min_col, max_col + 1):
+            for row in range(min_row, max_row + 1):
+                cells.setdefault((col, row), []).append(index)
+
+    # The checkpoints are added in order, so the candidates of a cell are sorted by their ID
+    return {cell: tuple(candidates) for cell, candidates in cells.items()}
+
+
+def pack_grid(cells):
+    """Flattens the grid into arrays, so that it can be saved.
+
+    Args:
+        cells (dict): The IDs of the checkpoints in each (column, row) cell.
+
+    Returns:
+        ndarray: A (K, 2) int32 array of the column and row of each cell.
+        ndarray: A (K + 1,) int64 array of where the IDs of each cell start in the IDs array.
+        ndarray: The int32 IDs of the checkpoints of all of the cells.
+    """
+    grid_cells = np.array(list(cells), dtype=np.int32).reshape(-1, 2)
+    cell_starts = np.concatenate(([0], np.cumsum([len(ids) for ids in cells.values()]))).astype(np.int64)
+    cell_ids = np.array([index for ids in cells.values() for index in ids], dtype=np.int32)
+    return grid_cells, cell_starts, cell_ids
+
+
+def unpack_grid(grid_cells, cell_starts, cell_ids):
+    """Rebuilds the grid flattened by pack_grid.
+
+    Args:
+        grid_cells (ndarray): A (K, 2) array of the column and row of each cell.
+        cell_starts (ndarray): A (K + 1,) array of where the IDs of each cell start in the IDs array.
+        cell_ids (ndarray): The IDs of the checkpoints of all of the cells.
+
+    Returns:
+        dict: The IDs of the checkpoints in each (column, row) cell.
+    """
+    cells = grid_cells.tolist()
+    starts = cell_starts.tolist()
+    ids = cell_ids.tolist()
+    return {tuple(cell): tuple(ids[starts[k]:starts[k + 1]]) for k, cell in enumerate(cells)}
+
+
+def checkpoint_geometry(quads):
+    """Finds the line leading to the next checkpoint of each checkpoint, and how far from it a
+    point of the checkpoint can be.
+
+    Args:
+        quads (ndarray): A (C, 4, 2) array of the corners of each checkpoint, in the order of the polygon exterior.
+
+    Returns:
+        ndarray: A (C, 2) array of a point on the line of each checkpoint.
+        ndarray: A (C, 2) array of the unit normal of the line of each checkpoint.
+        float: The farthest any point of a checkpoint is from its line.
+    """
+    # The line from the third to the fourth corner of a quad leads to the next checkpoint
+    edges = quads[:, 3] - quads[:, 2]
+    edge_origins = quads[:, 2]
+    edge_normals = np.stack((-edges[:, 1], edges[:, 0]), axis=1) / np.linalg.norm(edges, axis=1)[:, None]
+
+    corner_dists = np.abs(np.einsum("cki,ci->ck", quads - edge_origins[:, None], edge_normals))
+    max_checkpnt_len = float(corner_dists.max()) if len(quads) > 0 else 1
+
+    return edge_origins, edge_normals, max_checkpnt_len
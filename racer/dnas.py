@@ -1,49 +1,124 @@
 
 import math
 import random
-from p5 import *
+import numpy as np
+from checkpoints import CheckpointIndex
+from profilers import NULL_PROFILER
 from random import randrange, choice
-from shapely.geometry import Point
+
+# Every gene is a force of this magnitude pointing in a random direction
+GENE_MAGNITUDE = 3000
+
+# The ways the force of the ticks between two control points can be found
+INTERPOLATIONS = ("constant", "linear")
+
+# The columns of the tracking state of a Dna: the read cursor of the ticks, the last checkpoint the car was
+# found in, the farthest checkpoint reached and the last gene added to the path ranges
+CURRENT_TICK, CURRENT_CHECKPOINT, FARTHEST_POLY_REACHED, LAST_TRACKED_GENE = range(4)
 
 
 class Dna:
 
-    def __init__(self, checkpoint_polys, num_of_genes, genes=None, mutated=False, id=-1):
+    def __init__(self, checkpoint_polys, num_of_genes, genes=None, mutated=False, id=-1, checkpoint_index=None,
+                 control_interval=1, interpolation="constant", path_ranges=None, checkpoint_ticks=None,
+                 tracking=None):
         """The init can either create a random or specific Dna object
 
         Args:
             checkpoint_polys (list of Polygon obj): A list of polygons describing the checkpoints in the track.
-            num_of_genes (int): The number of genes for the Dna to have.
-            genes (list of Vector obj, optional): A list of genes to create the Dna obj from. Defaults to None.
+            num_of_genes (int): The number of ticks the Dna has a force for.
+            genes (ndarray, optional): A (num_of_points, 2) float32 array of genes to create the Dna obj from.
+                                       Defaults to None.
             mutated (bool, optional): A bool to note if the Dna muteted. Defaults to False.
             id (int, optional): The id of the Dna obj. Defaults to -1.
+            checkpoint_index (CheckpointIndex obj, optional): The index of the checkpoint polygons, shared between
+                                                              Dna objects. Defaults to building a new one.
+            control_interval (int, optional): The number of ticks between the control points that are the genes,
+                                              1 to have a gene for every tick. Defaults to 1.
+            interpolation (str, optional): One of INTERPOLATIONS, "constant" to hold the force of a control point
+                                           until the next one or "linear" to blend between them.
+                                           Defaults to "constant".
+            path_ranges (ndarray, optional): A (checkpoints, 2) int32 array to track the path of the car in,
+                                             such as a row of the path ranges of a whole population.
+                                             Defaults to a new array.
+            checkpoint_ticks (ndarray, optional): A (checkpoints,) int32 array to note the tick each checkpoint
+                                                  was first reached on in. Defaults to a new array.
+            tracking (ndarray, optional): A (4,) int64 array to keep the read cursor and the path tracking state
+                                          in, such as a row of the tracking state of a whole population.
+                                          Defaults to a new array.
         """
 
         self.fitness = 0
         self.checkpoint_polys = checkpoint_polys
-        self.path_list = []
-        self.farthest_poly_reached = 0
+        self.checkpoint_index = checkpoint_index if checkpoint_index is not None else \
+            CheckpointIndex(checkpoint_polys)
         self.id = id
         self.num_of_genes = num_of_genes
+        self.control_interval = control_interval
+        self.interpolation = interpolation
+        self.num_of_points = Dna.count_points(num_of_genes, control_interval)
         self.mutated = mutated
 
-        self.max_checkpnt_len = width if width > height else height
+        # The read cursor of the ticks, every control_interval of which share a gene, and the checkpoints and
+        # the last gene tracked, which are read through the properties of the columns
+        if tracking is None:
+            tracking = np.zeros(4, dtype=np.int64)
+        self.tracking = tracking
+        self.tracking[:] = (0, -1, 0, -1)
 
-        # Add enough empty lists to the path_list so that the vectors in genes could be
-        # divided to each polygon
-        for i in range(0, len(self.checkpoint_polys)):
-            self.path_list.append([])
+        # The range of the indices of the genes, from the first to one past the last, that moved the car
+        # through each checkpoint. A range that starts where it ends is empty.
+        if path_ranges is None:
+            path_ranges = np.zeros((len(self.checkpoint_polys), 2), dtype=np.int32)
+        self.path_ranges = path_ranges
+
+        # The read cursor of the ticks when the car first got farther than each checkpoint before it, or 0
+        if checkpoint_ticks is None:
+            checkpoint_ticks = np.zeros(len(self.checkpoint_polys), dtype=np.int32)
+        self.checkpoint_ticks = checkpoint_ticks
 
         if genes is None:
             # The genetic sequence
-            self.genes = []
-            for x in range(0, int(num_of_genes)):
-                vec = Vector.random_2D()
-                vec.limit(5000, 3000)
-                self.genes.append(vec)
+            self.genes = Dna.random_genes(self.num_of_points)
         else:
             self.genes = genes
 
+    @property
+    def current_tick(self):
+        """The read cursor of the ticks."""
+        return int(self.tracking[CURRENT_TICK])
+
+    @current_tick.setter
+    def current_tick(self, tick):
+        self.tracking[CURRENT_TICK] = tick
+
+    @property
+    def current_checkpoint(self):
+        """The last checkpoint the car was found in, or -1."""
+        return int(self.tracking[CURRENT_CHECKPOINT])
+
+    @current_checkpoint.setter
+    def current_checkpoint(self, checkpoint):
+        self.tracking[CURRENT_CHECKPOINT] = checkpoint
+
+    @property
+    def farthest_poly_reached(self):
+        """The farthest checkpoint reached."""
+        return int(self.tracking[FARTHEST_POLY_REACHED])
+
+    @farthest_poly_reached.setter
+    def farthest_poly_reached(self, checkpoint):
+        self.tracking[FARTHEST_POLY_REACHED] = checkpoint
+
+    @property
+    def last_tracked_gene(self):
+        """The last gene added to the path ranges, or -1."""
+        return int(self.tracking[LAST_TRACKED_GENE])
+
+    @last_tracked_gene.setter
+    def last_tracked_gene(self, gene):
+        self.tracking[LAST_TRACKED_GENE] = gene
+
     def calculate_fitness(self, pos):
         """Calculates the fitness of the Dna. The fitness is calculated based
         on the distance to the next checkpoint of the map.
@@ -52,19 +127,43 @@ class Dna:
             pos (tuple): A tuple cooresponding to the possition of the car.
         """
 
-        # First, the number checkpoints reached so far is calculated, then
-        # the distance to the next checkpoint line is added. For greater differences between
-        # fitnesses, the resulting number is cubed.
+        # The number checkpoints reached so far plus the part of the current one covered is read from
+        # the progress field of the track. For greater differences between fitnesses, it is cubed.
 
         self.fitness = self.find_current_checkpoint(pos)
 
         if self.fitness != -1:
-            dist_to_next_chpt = self.find_dist_to_next_chpt(
-                pos, self.checkpoint_polys[self.fitness])
-
-            self.fitness += 1 - remap(dist_to_next_chpt, (0, self.max_checkpnt_len), (0, 1))
+            self.fitness = self.checkpoint_index.progress(pos, self.fitness)
             self.fitness *= self.fitness * self.fitness
 
+    @staticmethod
+    def calculate_fitnesses(positions, checkpoint_index):
+        """Calculates the fitness of many cars at once, the same way calculate_fitness does for one.
+
+        Args:
+            positions (ndarray): A (n, 2) array of the positions of the cars.
+            checkpoint_index (CheckpointIndex obj): The index of the checkpoint polygons.
+
+        Returns:
+            ndarray: The fitness of each car.
+        """
+        # Cubing keeps the -1 of the cars that are off the track
+        return Dna.calculate_progresses(positions, checkpoint_index) ** 3
+
+    @staticmethod
+    def calculate_progresses(positions, checkpoint_index):
+        """Measures how far along the track many cars are, as the number of checkpoints reached plus
+        the part of the current checkpoint covered. This is the fitness before it is cubed.
+
+        Args:
+            positions (ndarray): A (n, 2) array of the positions of the cars.
+            checkpoint_index (CheckpointIndex obj): The index of the checkpoint polygons.
+
+        Returns:
+            ndarray: The progress of each car, or -1 for the cars that are not in any checkpoint.
+        """
+        return checkpoint_index.progresses(np.trunc(positions))
+
     def find_current_checkpoint(self, pos):
         """Finds the checkpoint polygon that the car is in.
 
@@ -75,140 +174,433 @@ class Dna:
             [int]: The ID of the checkpoint polygon in witch he car is in.
         """
 
-        position = Point(pos)
-
-        current_checkpoint_id = -1
-        for i, poly in enumerate(self.checkpoint_polys):
-            if poly.contains(position):
-                current_checkpoint_id = i
-                break
+        current_checkpoint_id = self.checkpoint_index.find(pos, self.current_checkpoint)
+        if current_checkpoint_id != -1:
+            self.current_checkpoint = current_checkpoint_id
 
         return current_checkpoint_id
 
-    def find_dist_to_next_chpt(self, pos, current_polygon):
-        """Calculates the distance to the next checkpoint polygon
+    @property
+    def next_gene(self):
+        """Reads the force of the tick under the cursor and moves the cursor forward. Ticks between
+        two control points either get the force of the earlier one or a blend of both.
+
+        Returns:
+            ndarray: The x and y of the force, or None if all of the ticks have been used.
+        """
+        tick = self.current_tick
+
+        if tick >= self.num_of_genes or tick // self.control_interval >= len(self.genes):
+            return None
+
+        self.current_tick += 1
+        return self.force_at(tick)
+
+    def force_at(self, tick):
+        """Finds the force the genes give a tick.
 
         Args:
-            pos (tuple): tuple describing the current car position
-            current_polygon (int): the ID of the polygon in witch the car is in
+            tick (int): The tick, which has to be covered by the genes.
 
         Returns:
-            float: The distance to the next checkpoint polygon
+            ndarray: The x and y of the force.
         """
+        point, offset = divmod(tick, self.control_interval)
+
+        if offset == 0 or self.interpolation == "constant" or point + 1 >= len(self.genes):
+            return self.genes[point]
+
+        weight = offset / self.control_interval
+        return (1 - weight) * self.genes[point] + weight * self.genes[point + 1]
 
-        # |AC x AB| / |AB| where AB is the line and C is the point
-        # Calculates the distace to the next checkpoint polygon using the formula above.
-        current_poly_coords = list(current_polygon.exterior.coords)
+    @staticmethod
+    def forces_at(genomes, rows, ticks, control_interval, interpolation):
+        """Finds the forces the genes of many Dna give a tick each at once, the same way force_at does
+        for one.
 
-        ab = Dna.vector_from_two_points(
-            current_poly_coords[2], current_poly_coords[3])
+        Args:
+            genomes (ndarray): The (P, K, 2) genes of a population.
+            rows (ndarray): The row of the genes of each Dna in the genomes.
+            ticks (ndarray): The tick of each Dna, which has to be covered by its genes.
+            control_interval (int): The number of ticks between the control points that are the genes.
+            interpolation (str): One of INTERPOLATIONS.
 
-        ac = Dna.vector_from_two_points(current_poly_coords[2], pos)
+        Returns:
+            ndarray: A (n, 2) float32 array of the x and y of each force.
+        """
+        if interpolation == "constant" or control_interval == 1:
+            return genomes[rows, ticks // control_interval]
 
-        ac_ab_cross = ac.cross(ab)
+        # The last control point and the ticks on a control point get a weight of 0, which leaves them as they are
+        points, offsets = np.divmod(ticks, control_interval)
+        next_points = np.minimum(points + 1, genomes.shape[1] - 1)
+        weights = np.where(next_points > points, offsets / control_interval, 0)
 
-        magnitude_of_ac_ab_cross = ac_ab_cross.magnitude
-        magnitude_of_ab = ab.magnitude
+        # The weights are rounded to float32 the same way NumPy rounds them for a single gene
+        return (1 - weights).astype(np.float32)[:, None] * genomes[rows, points] + \
+            weights.astype(np.float32)[:, None] * genomes[rows, next_points]
 
-        distance = magnitude_of_ac_ab_cross / magnitude_of_ab
+    def count_driving_points(self, num_of_ticks):
+        """Counts the genes that the forces of the first ticks depend on.
 
-        return distance
+        Args:
+            num_of_ticks (int): The number of ticks from the start.
+
+        Returns:
+            int: The length of the prefix of the genes that drives those ticks.
+        """
+        num_of_points = (num_of_ticks - 1) // self.control_interval + 1
+
+        # Blending reaches into the next control point
+        if self.interpolation == "linear":
+            num_of_points += 1
+
+        return min(num_of_points, len(self.genes))
 
     @property
-    def next_gene(self):
-        if len(self.genes) > 0:
-            return self.genes.pop(0)
+    def current_gene(self):
+        """The index of the gene the last tick read was driven by.
+
+        Returns:
+            int: The index of the gene, or -1 before the first tick.
+        """
+        return (self.current_tick - 1) // self.control_interval
+
+    @staticmethod
+    def count_points(num_of_genes, control_interval):
+        """Counts the control points needed to cover every tick.
+
+        Args:
+            num_of_genes (int): The number of ticks.
+            control_interval (int): The number of ticks between control points.
+
+        Returns:
+            int: The number of control points.
+        """
+        return math.ceil(int(num_of_genes) / control_interval)
+
+    @staticmethod
+    def random_genes(num_of_genes, rng=None):
+        """Creates an array of random genes.
+
+        Args:
+            num_of_genes (int): The number of genes to create.
+            rng (Generator obj, optional): The generator to draw the genes from. Defaults to the global
+                                           NumPy one.
+
+        Returns:
+            ndarray: A (num_of_genes, 2) float32 array of forces of GENE_MAGNITUDE in random directions.
+        """
+        if rng is None:
+            genes = np.random.random((num_of_genes, 2)).astype(np.float32)
         else:
-            return None
+            genes = rng.random((num_of_genes, 2), dtype=np.float32)
+
+        Dna.scale_genes(genes)
+        return genes
 
     @staticmethod
-    def vector_from_two_points(point1, point2):
-        x = point2[0] - point1[0]
-        y = point2[1] - point1[1]
-        return Vector(x, y)
+    def fill_random_genes(genes, rng):
+        """Overwrites an array of genes with random ones in place, the same way random_genes creates them.
 
-    def add_to_path_list(self, pos, current_gene):
-        """Update the path list to track the possition of the car, if the car has not turned around.
+        Args:
+            genes (ndarray): A C-contiguous float32 array of genes of any shape ending with 2.
+            rng (Generator obj): The generator to draw the genes from.
+        """
+        rng.random(out=genes, dtype=np.float32)
+        Dna.scale_genes(genes)
+
+    @staticmethod
+    def scale_genes(genes):
+        """Turns uniform random numbers from 0 to 1 into forces of GENE_MAGNITUDE in place.
+
+        Args:
+            genes (ndarray): A float32 array of genes of any shape ending with 2.
+        """
+        genes -= 0.5
+
+        magnitudes = genes[..., 0] * genes[..., 0] + genes[..., 1] * genes[..., 1]
+        np.sqrt(magnitudes, out=magnitudes)
+        np.divide(GENE_MAGNITUDE, magnitudes, out=magnitudes)
+        genes *= magnitudes[..., None]
+
+    def add_to_path_ranges(self, pos, current_gene):
+        """Update the path ranges to track the possition of the car, if the car has not turned around.
+        The range of a checkpoint grows to the latest gene tracked in it, so it also covers the genes of
+        any ticks in between that the car spent behind the farthest checkpoint.
 
         Args:
             pos (tuple): The current position of the car
-            current_vector (Vector object): The gene that the car was just moved by
+            current_gene (int): The index of the gene that the car was just moved by
+
+        Returns:
+            bool: True if the car got farther than the farthest checkpoint before.
         """
 
         current_checkpoint = self.find_current_checkpoint(pos)
+        reached_new_checkpoint = self.farthest_poly_reached < current_checkpoint
+
+        if reached_new_checkpoint:
+            self.checkpoint_ticks[current_checkpoint] = self.current_tick
 
+        # If the car turns around, we don't want to save that
         if self.farthest_poly_reached <= current_checkpoint:
             self.farthest_poly_reached = current_checkpoint
-            self.path_list[current_checkpoint].append(current_gene)
-        # If the car turns around, we don't want to save that
-        elif self.farthest_poly_reached > current_checkpoint:
-            return
 
-    def remove_from_path_list(self, num_vec_to_remove):
-        """Removes a specified amount of genes from the end of the gene list
-        to help map exploration.
+            if current_gene > self.last_tracked_gene:
+                self.last_tracked_gene = current_gene
+
+                path_range = self.path_ranges[current_checkpoint]
+                if path_range[0] == path_range[1]:
+                    path_range[0] = current_gene
+                path_range[1] = current_gene + 1
+
+        return reached_new_checkpoint
+
+    @staticmethod
+    def add_to_path_ranges_all(path_ranges, checkpoint_ticks, tracking, rows, checkpoints, control_interval):
+        """Updates the path ranges of many Dna at once, the same way add_to_path_ranges does for one,
+        for the gene each of them was just moved by.
+
+        Args:
+            path_ranges (ndarray): The (P, C, 2) path ranges of a population.
+            checkpoint_ticks (ndarray): The (P, C) ticks the checkpoints were first reached on.
+            tracking (ndarray): The (P, 4) tracking state of the population, with the read cursor already
+                                moved past the tick that was just applied.
+            rows (ndarray): The different rows of the Dna to update.
+            checkpoints (ndarray): The checkpoint each car was found in, or -1.
+            control_interval (int): The number of ticks between the control points that are the genes.
+
+        Returns:
+            ndarray: Whether each car got farther than the farthest checkpoint before.
+        """
+        found = checkpoints != -1
+        tracking[rows[found], CURRENT_CHECKPOINT] = checkpoints[found]
+
+        ticks = tracking[rows, CURRENT_TICK]
+        farthest = tracking[rows, FARTHEST_POLY_REACHED]
+        reached_new_checkpoint = farthest < checkpoints
+
+        new_rows = rows[reached_new_checkpoint]
+        checkpoint_ticks[new_rows, checkpoints[reached_new_checkpoint]] = ticks[reached_new_checkpoint]
+
+        # The cars that turned around are not tracked
+        forward = farthest <= checkpoints
+        tracking[rows[forward], FARTHEST_POLY_REACHED] = checkpoints[forward]
+
+        genes = (ticks - 1) // control_interval
+        tracked = np.nonzero(forward & (genes > tracking[rows, LAST_TRACKED_GENE]))[0]
+        rows, checkpoints, genes = rows[tracked], checkpoints[tracked], genes[tracked]
+        tracking[rows, LAST_TRACKED_GENE] = genes
+
+        # An empty range starts at the gene, any other one grows to it
+        starts = path_ranges[rows, checkpoints, 0]
+        empty = starts == path_ranges[rows, checkpoints, 1]
+        path_ranges[rows, checkpoints, 0] = np.where(empty, genes, starts)
+        path_ranges[rows, checkpoints, 1] = genes + 1
+
+        return reached_new_checkpoint
+
+    def remove_from_path_ranges(self, num_vec_to_remove):
+        """Removes a specified amount of genes from the end of the path ranges
+        to help map exploration, by moving the ends of the last ranges back.
 
         Args:
-            num_vec_to_remove (int): number of genes to remove
+            num_vec_to_remove (int): number of ticks of genes to remove, rounded up to whole control points
         """
 
-        pb_to_remove_from = self.farthest_poly_reached
-        for i in range(num_vec_to_remove):
-            if(len(self.path_list[pb_to_remove_from]) != 0):
-                self.path_list[pb_to_remove_from].pop()
-            elif (pb_to_remove_from - 1) >= 0:
-                pb_to_remove_from -= 1
-            else:
+        num_to_remove = Dna.count_points(num_vec_to_remove, self.control_interval)
+
+        for path_range in self.path_ranges[self.farthest_poly_reached::-1]:
+            if num_to_remove == 0:
                 break
 
-    def crossover(self, partner, mutation_rate):
+            removed = min(num_to_remove, int(path_range[1] - path_range[0]))
+            path_range[1] -= removed
+            num_to_remove -= removed
+
+    def reset(self, genes, mutated=False):
+        """Reuses the Dna object for a new genome, clearing the path tracking and the read cursor
+        in place instead of allocating a new Dna.
+
+        Args:
+            genes (ndarray): A (num_of_points, 2) float32 array of the new genes.
+            mutated (bool, optional): A bool to note if the Dna muteted. Defaults to False.
+        """
+        self.genes = genes
+        self.mutated = mutated
+        self.fitness = 0
+        self.tracking[:] = (0, -1, 0, -1)
+        self.path_ranges[:] = 0
+        self.checkpoint_ticks[:] = 0
+
+    def resume(self, tick, checkpoint, last_tracked_gene, path_ranges, checkpoint_ticks):
+        """Moves the read cursor and the path tracking to where another Dna with the same genes up to
+        the tick had them, to carry on from there.
+
+        Args:
+            tick (int): The read cursor of the ticks.
+            checkpoint (int): The farthest checkpoint reached, which the car is in.
+            last_tracked_gene (int): The last gene added to the path ranges.
+            path_ranges (ndarray): The path ranges of the checkpoints up to the farthest one.
+            checkpoint_ticks (ndarray): The ticks the checkpoints up to the farthest one were reached on.
+        """
+        self.current_tick = tick
+        self.current_checkpoint = checkpoint
+        self.farthest_poly_reached = checkpoint
+        self.last_tracked_gene = last_tracked_gene
+        self.path_ranges[:checkpoint + 1] = path_ranges
+        self.checkpoint_ticks[:checkpoint + 1] = checkpoint_ticks
+
+    def crossover(self, partner, mutation_rate, child=None, profiler=NULL_PROFILER):
+        """Creates a child Dna from blocks of genes of this Dna and the partner.
+
+        Args:
+            partner (Dna obj): The other parent.
+            mutation_rate (float): The chance of the child to mutate.
+            child (Dna obj, optional): A Dna object that is no longer used, to reset and return as
+                                       the child instead of creating a new one. Defaults to None.
+            profiler (Profiler obj, optional): The profiler to time the mutation with.
+                                               Defaults to not timing it.
+
+        Returns:
+            Dna obj: The child.
+        """
         new_genes = []
 
-        for i, gene_block in enumerate(self.path_list):
-            if len(partner.path_list[i]) == 0 and len(gene_block) == 0:
-                # If both of the parters don't have genes for the current gene block, top the crossover.
-                break
+        # If both of the parters don't have genes for a gene block, the crossover stops before it.
+        has_genes = (self.path_ranges[:, 1] > self.path_ranges[:, 0]) | \
+            (partner.path_ranges[:, 1] > partner.path_ranges[:, 0])
+        num_of_blocks = len(has_genes) if has_genes.all() else int(np.argmin(has_genes))
 
+        for i in range(num_of_blocks):
             # Chose the parent of the next gene block randomly.
-            new_genes.extend(choice([gene_block, partner.path_list[i]]))
+            parent = choice([self, partner])
+            start, end = parent.path_ranges[i]
+            new_genes.append(parent.genes[start:end])
+
+        if len(new_genes) > 0:
+            new_genes = np.concatenate(new_genes)
+        else:
+            new_genes = np.empty((0, 2), dtype=np.float32)
+
+        with profiler.phase("mutation"):
+            mutated, new_genes = self.mutate(new_genes, mutation_rate)
 
-        mutated, new_genes = self.mutate(new_genes, mutation_rate)
         new_genes = self.normalize_gene_list(new_genes)
 
-        return Dna(self.checkpoint_polys, self.num_of_genes, new_genes, mutated)
+        if child is not None:
+            child.reset(new_genes, mutated)
+            return child
+
+        return Dna(self.checkpoint_polys, self.num_of_genes, new_genes, mutated,
+                   checkpoint_index=self.checkpoint_index, control_interval=self.control_interval,
+                   interpolation=self.interpolation)
+
+    @staticmethod
+    def crossover_all(genomes, path_ranges, parents, children, rng):
+        """Writes the genes a child of every pair of parents takes from them into a genome matrix at
+        once, the same way crossover does for one child. Every gene block is taken from either parent
+        at random, until the first block that neither parent has genes for.
+
+        Args:
+            genomes (ndarray): The (P, K, 2) genes of the parents' population.
+            path_ranges (ndarray): The (P, C, 2) path ranges of the parents' population.
+            parents (ndarray): The (n, 2) indices of the two parents of each child.
+            children (ndarray): The (n, K, 2) genes of the children to write into. It can't share memory
+                                with genomes.
+            rng (Generator obj): The generator to pick the parent of each gene block with.
+
+        Returns:
+            ndarray: The number of genes each child took from its parents, before the ones that didn't
+                     fit were dropped. The genes after them are left for mutate_all to fill.
+        """
+        num_of_checkpoints = path_ranges.shape[1]
+        ranges_a = path_ranges[parents[:, 0]]
+        ranges_b = path_ranges[parents[:, 1]]
+        lengths_a = ranges_a[:, :, 1] - ranges_a[:, :, 0]
+        lengths_b = ranges_b[:, :, 1] - ranges_b[:, :, 0]
+
+        # The blocks from the first one that neither parent has genes for are dropped
+        kept = np.cumprod((lengths_a > 0) | (lengths_b > 0), axis=1)
+
+        from_b = rng.random(lengths_a.shape) < 0.5
+        sources = np.where(from_b, parents[:, 1:], parents[:, :1]).ravel()
+        starts = np.where(from_b, ranges_b[:, :, 0], ranges_a[:, :, 0]).ravel()
+        block_lengths = np.where(from_b, lengths_b, lengths_a) * kept
+
+        # The offset of each block in its child and in the list of every gene copied
+        child_offsets = (np.cumsum(block_lengths, axis=1) - block_lengths).ravel()
+        block_lengths = block_lengths.ravel()
+        copy_offsets = np.cumsum(block_lengths) - block_lengths
+
+        # Every gene copied, with the block it is in and its place in the block
+        blocks = np.repeat(np.arange(len(block_lengths)), block_lengths)
+        places = np.arange(len(blocks)) - copy_offsets[blocks]
+        columns = child_offsets[blocks] + places
+
+        # The blocks of different parents can add up to more genes than a child has room for
+        fits = columns < children.shape[1]
+        blocks, places, columns = blocks[fits], places[fits], columns[fits]
+
+        children[blocks // num_of_checkpoints, columns] = genomes[sources[blocks], starts[blocks] + places]
+
+        return block_lengths.reshape(len(parents), num_of_checkpoints).sum(axis=1)
+
+    @staticmethod
+    def mutate_all(children, lengths, mutation_rate, rng):
+        """Mutates the genes of many children at once, the same way mutate does for one. A mutated child
+        gets new random values for the last 10 to 30 percent of the genes it took from its parents. The
+        genes after those are left as they are, so the children are padded the way normalize_gene_list
+        pads one by filling them with fill_random_genes before crossover_all.
+
+        Args:
+            children (ndarray): The (n, K, 2) genes of the children.
+            lengths (ndarray): The number of genes each child took from its parents.
+            mutation_rate (float): The chance of each child to mutate.
+            rng (Generator obj): The generator to draw the mutations and the random genes from.
+
+        Returns:
+            ndarray: Whether each child mutated.
+        """
+        mutated = rng.random(len(children)) < mutation_rate
+        affected_genes = rng.uniform(0.1, 0.3, len(children))
+
+        start_of_mutation = np.floor(lengths - lengths * affected_genes).astype(int)
+        columns = np.arange(children.shape[1])
+        mutated_genes = np.flatnonzero(mutated[:, None] & (columns >= start_of_mutation[:, None]) &
+                                       (columns < lengths[:, None]))
+        children.reshape(-1, 2)[mutated_genes] = Dna.random_genes(len(mutated_genes), rng)
+
+        return mutated
 
     def normalize_gene_list(self, genes):
         """Add or remove additional genes if the length of the gene list
         is too big or small.
 
         Args:
-            genes (list of Vector obj): The list of genes
+            genes (ndarray): The array of genes
 
         Returns:
-            (list of Vector obj): The list of genes at the correct length
+            (ndarray): The array of genes at the correct length
         """
 
-        while len(genes) < self.num_of_genes:
-            vec = Vector.random_2D()
-            vec.limit(5000, 3000)
-            genes.append(vec)
+        if len(genes) < self.num_of_points:
+            genes = np.concatenate((genes, Dna.random_genes(self.num_of_points - len(genes))))
 
-        while len(genes) > self.num_of_genes:
-            genes.pop()
-
-        return genes
+        return genes[:self.num_of_points]
 
     def mutate(self, genes, mutation_rate):
         """Mutate 10 to 30 percent of the last genes in the genes by replacing
         the genes with new random values.
 
         Args:
-            genes (list of Vector obj): The list of genes
+            genes (ndarray): The array of genes
             mutation_rate (float): The rate of mutation
 
         Returns:
             (bool): Whether the mutation happened.
-            (list of Vector obj): The list of new, possibly mutated, genes
+            (ndarray): The array of new, possibly mutated, genes
         """
 
         mutation_rate *= 100
@@ -216,10 +608,7 @@ class Dna:
             # mutation only affects the end of the genes
             affected_genes = random.uniform(0.1, 0.3)
             start_of_mutation = math.floor(len(genes) - (len(genes) * affected_genes))
-            for i in range(start_of_mutation, len(genes)):
-                vec = Vector.random_2D()
-                vec.limit(5000, 3000)
-                genes[i] = vec
+            genes[start_of_mutation:] = Dna.random_genes(len(genes) - start_of_mutation)
 
             return True, genes
         else:
@@ -0,0 +1,253 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+import pymunk as pm
+from multiprocessing.connection import Client, Listener
+from map_handlers import MapHandler
+from physics import PHYSICS_BACKENDS
+from populations import Population
+from selections import SELECTIONS
+from simulators import Simulator
+from snapshots import seed_run
+
+AUTHKEY = b"racer-islands"
+
+# The seconds between checks that the island processes are still running while waiting for their results
+RESULT_POLL_INTERVAL = 1
+
+
+class QueueChannel:
+
+    def __init__(self, inbox, outbox):
+        """Sends migrants to the next island and receives them from the previous one
+        through multiprocessing queues, for islands running on the same machine.
+
+        Args:
+            inbox (Queue obj): The queue the previous island puts its migrants in.
+            outbox (Queue obj): The queue of the next island.
+        """
+        self.inbox = inbox
+        self.outbox = outbox
+
+    def send(self, migrants):
+        self.outbox.put(migrants)
+
+    def receive(self):
+        """Collects the migrants that have arrived so far, without waiting for more.
+
+        Returns:
+            list of tuple: The migrants received.
+        """
+        migrants = []
+        while True:
+            try:
+                migrants += self.inbox.get_nowait()
+            except queue.Empty:
+                return migrants
+
+
+class SocketChannel:
+
+    def __init__(self, address, next_address):
+        """Sends migrants to the next island and receives them from the previous one over TCP,
+        so that the islands can be spread over several machines.
+
+        Args:
+            address (tuple): The host and port to listen for migrants on.
+            next_address (tuple): The host and port of the next island.
+        """
+        self.next_address = next_address
+        self.connection = None
+        self.received = queue.Queue()
+
+        self.listener = Listener(address, authkey=AUTHKEY)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        """Receives migrants from every island that connects, on background threads."""
+        while True:
+            connection = self.listener.accept()
+            threading.Thread(target=self._read, args=(connection,), daemon=True).start()
+
+    def _read(self, connection):
+        try:
+            while True:
+                self.received.put(connection.recv())
+        except EOFError:
+            connection.close()
+
+    def send(self, migrants):
+        """Sends the migrants to the next island. Migrants are dropped while it is not listening yet.
+
+        Args:
+            migrants (list of tuple): The migrants to send.
+        """
+        try:
+            if self.connection is None:
+                self.connection = Client(self.next_address, authkey=AUTHKEY)
+            self.connection.send(migrants)
+        except OSError:
+            self.connection = None
+
+    def receive(self):
+        """Collects the migrants that have arrived so far, without waiting for more.
+
+        Returns:
+            list of tuple: The migrants received.
+        """
+        migrants = []
+        while True:
+            try:
+                migrants += self.received.get_nowait()
+            except queue.Empty:
+                return migrants
+
+
+def run_island(island_id, settings, channel, results=None):
+    """Evolves the population of one island, exchanging its best Dna with the other islands
+    every few generations, until a car finishes or it runs out of generations.
+
+    Args:
+        island_id (int): The id of the island.
+        settings (dict): The map_file, start_finish_offset, physics, selection, num_of_genes, end_spread,
+                         mutation_rate, pop_size, timestep, control_interval, interpolation,
+                         migration_interval, num_of_migrants, max_generations, stall_window and seed to use.
+        channel (QueueChannel or SocketChannel obj): The channel to exchange migrants through.
+        results (Queue obj, optional): A queue to report the outcome to. Defaults to None.
+
+    Returns:
+        tuple: The island id, whether a car finished, the number of generations and the seconds it took.
+    """
+    start_time = time.time()
+
+    if settings.get("seed") is not None:
+        seed_run(settings["seed"])
+
+    map_handler = MapHandler(pm.Space(), settings["map_file"], settings["start_finish_offset"])
+    physics = PHYSICS_BACKENDS[settings["physics"]](map_handler)
+    population = Population(settings["num_of_genes"], map_handler, settings["end_spread"],
+                            settings["mutation_rate"], settings["pop_size"], physics,
+                            selection=SELECTIONS[settings["selection"]](),
+                            control_interval=settings.get("control_interval", 1),
+                            interpolation=settings.get("interpolation", "constant"))
+    simulator = Simulator(population, settings["timestep"], stall_window=settings["stall_window"])
+
+    while True:
+        simulator.run_generation()
+
+        if population.finished or population.generations == settings["max_generations"]:
+            break
+
+        simulator.score()
+
+        if (population.generations + 1) % settings["migration_interval"] == 0:
+            # The genes and path ranges are views of the population's matrices, which reproduction writes
+            # over, and a queue only pickles them later on its feeder thread
+            channel.send([(dna.genes.copy(), dna.path_ranges.copy(), dna.farthest_poly_reached, dna.fitness)
+                          for dna in population.best_dnas(settings["num_of_migrants"])])
+
+        population.replace_worst(channel.receive())
+
+        simulator.reproduce()
+
+    outcome = (island_id, population.finished, population.generations, time.time() - start_time)
+
+    if results is not None:
+        results.put(outcome)
+
+    return outcome
+
+
+def run_islands(island_settings, transport="queue", addresses=None):
+    """Runs every island in its own process and waits for the first one with a car that finishes.
+
+    Args:
+        island_settings (list of dict): The settings of each island, as taken by run_island.
+        transport (str, optional): "queue" to migrate through local queues or "tcp" for sockets.
+                                   Defaults to "queue".
+        addresses (list of tuple, optional): The host and port of every island for the "tcp" transport.
+                                             Defaults to consecutive ports on localhost.
+
+    Returns:
+        tuple: The island id, whether a car finished, the number of generations and the seconds it took,
+               for the first island to finish, or the last one to run out of generations.
+    """
+    num_of_islands = len(island_settings)
+    results = mp.Queue()
+
+    if transport == "queue":
+        inboxes = [mp.Queue() for i in range(num_of_islands)]
+    elif addresses is None:
+        addresses = [("localhost", 6000 + i) for i in range(num_of_islands)]
+
+    processes = []
+    for island_id, settings in enumerate(island_settings):
+        next_id = (island_id + 1) % num_of_islands
+
+        if transport == "queue":
+            args = (island_id, settings, inboxes[island_id], inboxes[next_id], None, None, results)
+        else:
+            args = (island_id, settings, None, None, addresses[island_id], addresses[next_id], results)
+
+        process = mp.Process(target=_start_island, args=args, daemon=True)
+        process.start()
+        processes.append(process)
+
+    try:
+        reported = set()
+        while len(reported) < num_of_islands:
+            outcome = wait_for_result(results, processes, reported)
+            reported.add(outcome[0])
+
+            if outcome[1]:
+                break
+    finally:
+        for process in processes:
+            process.terminate()
+
+    return outcome
+
+
+def wait_for_result(results, processes, reported):
+    """Waits for the next island to report its outcome, checking that the islands that haven't
+    reported yet are still running. An island that stopped without reporting, such as after an error,
+    would otherwise leave the wait going on forever.
+
+    Args:
+        results (Queue obj): The queue the islands report their outcome to.
+        processes (list of Process obj): The process of each island.
+        reported (set): The ids of the islands that have already reported.
+
+    Returns:
+        tuple: The outcome of the island, as returned by run_island.
+
+    Raises:
+        RuntimeError: If an island stopped without reporting its outcome.
+    """
+    while True:
+        try:
+            return results.get(timeout=RESULT_POLL_INTERVAL)
+        except queue.Empty:
+            pass
+
+        stopped = [island_id for island_id, process in enumerate(processes)
+                   if island_id not in reported and not process.is_alive()]
+
+        if len(stopped) > 0:
+            # The outcome of an island is flushed to the queue before its process exits
+            try:
+                return results.get(timeout=RESULT_POLL_INTERVAL)
+            except queue.Empty:
+                raise RuntimeError(f"Island {stopped[0]} stopped with exit code {processes[stopped[0]].exitcode} "
+                                   "without reporting its outcome")
+
+
+def _start_island(island_id, settings, inbox, outbox, address, next_address, results):
+    """Creates the channel of an island inside its own process and runs it."""
+    if address is None:
+        channel = QueueChannel(inbox, outbox)
+    else:
+        channel = SocketChannel(address, next_address)
+
+    run_island(island_id, settings, channel, results)
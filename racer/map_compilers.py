@@ -0,0 +1,166 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+from checkpoints import build_grid, build_progress_field, checkpoint_geometry, pack_grid
+
+# Changed whenever the arrays of a compiled map change, so that older caches are not loaded
+FORMAT_VERSION = 2
+
+# The directory next to the map file that compiled maps are cached in by default
+CACHE_DIR = ".racer_cache"
+
+# The arrays a compiled map is made of, each saved to its own .npy file
+ARRAYS = ("wall_points", "quads", "edge_origins", "edge_normals", "max_checkpnt_len", "starting_line",
+          "finish_line", "start_point", "cell_size", "grid_cells", "cell_starts", "cell_ids", "field_origin",
+          "field_ids", "field_overlaps", "field_progresses")
+
+
+class CompiledMap:
+
+    def __init__(self, arrays):
+        """Holds everything derived from the geometry of a map file as NumPy arrays, which are
+        memory-mapped when the map is loaded from the cache.
+
+        Args:
+            arrays (dict): An array for every name in ARRAYS.
+        """
+        self.wall_points = arrays["wall_points"]            # (N, 2), every two points are a wall
+        self.quads = arrays["quads"]                        # (C, 4, 2), the corners of each checkpoint
+        self.edge_origins = arrays["edge_origins"]          # (C, 2)
+        self.edge_normals = arrays["edge_normals"]          # (C, 2)
+        self.max_checkpnt_len = float(arrays["max_checkpnt_len"])
+        self.starting_line = arrays["starting_line"]        # (2, 2)
+        self.finish_line = arrays["finish_line"]            # (2, 2)
+        self.start_point = arrays["start_point"]            # (2,)
+        self.cell_size = int(arrays["cell_size"])
+        self.grid_cells = arrays["grid_cells"]              # (K, 2), packed by checkpoints.pack_grid
+        self.cell_starts = arrays["cell_starts"]            # (K + 1,)
+        self.cell_ids = arrays["cell_ids"]
+        self.field_origin = arrays["field_origin"]          # (2,), the x and y of the first pixel of the field
+        self.field_ids = arrays["field_ids"]                # (H, W), by checkpoints.build_progress_field
+        self.field_overlaps = arrays["field_overlaps"]      # (H, W)
+        self.field_progresses = arrays["field_progresses"]  # (H, W)
+
+
+def compile_map(map_file, start_finish_offset, cache_dir=None, cell_size=32):
+    """Loads the compiled map of a map file from the cache, compiling and caching it first if the
+    file hasn't been compiled with the same contents and settings before.
+
+    Args:
+        map_file (str): The location and name of the map file.
+        start_finish_offset (int): The offset of pixels the finish line is before the start line.
+        cache_dir (str, optional): The directory to cache compiled maps in. Defaults to CACHE_DIR
+                                   next to the map file.
+        cell_size (int, optional): The width and height of a cell of the checkpoint grid in pixels.
+                                   Defaults to 32.
+
+    Returns:
+        CompiledMap obj: The compiled map.
+    """
+    with open(map_file, "rb") as file:
+        content = file.read()
+
+    settings = f"|{start_finish_offset}|{cell_size}|{FORMAT_VERSION}".encode()
+    key = hashlib.sha256(content + settings).hexdigest()
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(map_file)), CACHE_DIR)
+    directory = os.path.join(cache_dir, key)
+
+    if not os.path.isdir(directory):
+        arrays = build_map(content.decode().splitlines(), start_finish_offset, cell_size)
+
+        try:
+            save_compiled_map(directory, arrays)
+        except OSError:
+            # The map can still be used if the cache can't be written to
+            return CompiledMap(arrays)
+
+    return load_compiled_map(directory)
+
+
+def build_map(lines, start_finish_offset, cell_size=32):
+    """Derives the geometry of the track from the lines of a map file.
+
+    Args:
+        lines (list of str): The lines of the map file.
+        start_finish_offset (int): The offset of pixels the finish line is before the start line.
+        cell_size (int, optional): The width and height of a cell of the checkpoint grid in pixels.
+                                   Defaults to 32.
+
+    Returns:
+        dict: An array for every name in ARRAYS.
+    """
+    wall_points = np.genfromtxt(lines, delimiter=',', comments='#').reshape(-1, 2)
+
+    # A point without a pair doesn't make a wall
+    wall_points = wall_points[:len(wall_points) - len(wall_points) % 2]
+
+    # Every two walls make the sides of a checkpoint, but not the finish/start line at the end
+    firsts = np.arange(0, len(wall_points) - 2, 4)
+    quads = wall_points[firsts[:, None] + np.array([0, 2, 3, 1])].reshape(-1, 4, 2)
+
+    edge_origins, edge_normals, max_checkpnt_len = checkpoint_geometry(quads)
+    grid_cells, cell_starts, cell_ids = pack_grid(build_grid(quads, cell_size))
+    field_origin, field_ids, field_overlaps, field_progresses = \
+        build_progress_field(quads, edge_origins, edge_normals, max_checkpnt_len)
+
+    # The start line is just after the finish/start line of the map and the finish line just before it
+    starting_line = wall_points[-2:] + start_finish_offset
+    finish_line = wall_points[-2:] - start_finish_offset
+
+    return {
+        "wall_points": wall_points,
+        "quads": quads,
+        "edge_origins": edge_origins,
+        "edge_normals": edge_normals,
+        "max_checkpnt_len": np.array(max_checkpnt_len),
+        "starting_line": starting_line,
+        "finish_line": finish_line,
+        "start_point": starting_line.mean(axis=0),
+        "cell_size": np.array(cell_size),
+        "grid_cells": grid_cells,
+        "cell_starts": cell_starts,
+        "cell_ids": cell_ids,
+        "field_origin": field_origin,
+        "field_ids": field_ids,
+        "field_overlaps": field_overlaps,
+        "field_progresses": field_progresses
+    }
+
+
+def save_compiled_map(directory, arrays):
+    """Saves the arrays of a compiled map to a directory of .npy files. The files are written to a
+    temporary directory that is then renamed, so that processes compiling the same map at the same
+    time never load a half written one.
+
+    Args:
+        directory (str): The directory to save the compiled map to.
+        arrays (dict): An array for every name in ARRAYS.
+    """
+    temp_directory = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(temp_directory, exist_ok=True)
+
+    for name in ARRAYS:
+        np.save(os.path.join(temp_directory, name + ".npy"), arrays[name])
+
+    try:
+        os.rename(temp_directory, directory)
+    except OSError:
+        # Another process got there first
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        if not os.path.isdir(directory):
+            raise
+
+
+def load_compiled_map(directory):
+    """Memory-maps the arrays of a compiled map.
+
+    Args:
+        directory (str): The directory the compiled map was saved to.
+
+    Returns:
+        CompiledMap obj: The compiled map.
+    """
+    return CompiledMap({name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in ARRAYS})
@@ -0,0 +1,422 @@
+import numpy as np
+import pymunk
+
+collision_types = {
+    "car": 1,
+    "wall": 2,
+    "finish_line": 3
+}
+
+# Shapes of the same group never collide, so the cars are not checked against each other
+car_filter = pymunk.ShapeFilter(group=collision_types["car"])
+
+
+class PymunkPhysics:
+
+    def __init__(self, map_handler):
+        """Simulates every car as its own pymunk body in the shared space of the map. One pair of
+        collision handlers per space looks the touching car up by its shape, and the bodies of the
+        cars that stopped are removed together after each step.
+
+        Args:
+            map_handler (MapHandler obj): Object describing the map of the track.
+        """
+        self.map_handler = map_handler
+        self.space = map_handler.space
+
+        handler_wall = self.space.add_collision_handler(collision_types["car"], collision_types["wall"])
+        handler_fin = self.space.add_collision_handler(collision_types["car"], collision_types["finish_line"])
+
+        # The handlers are created once per space, so every PymunkPhysics of the space shares their data
+        self.cars = handler_wall.data.setdefault("cars", {})
+        self.stopped = handler_wall.data.setdefault("stopped", [])
+        handler_fin.data["cars"] = self.cars
+        handler_fin.data["stopped"] = self.stopped
+
+        handler_wall.begin = PymunkPhysics.touched_wall
+        handler_fin.begin = PymunkPhysics.reached_finish
+
+    def add_car(self, car, start_point):
+        """Adds a body for the car to the space and makes it react to walls and the finish line.
+
+        Args:
+            car (Car obj): The car to add.
+            start_point (tuple): A tuple with x and y coords used to set the initial car location.
+        """
+        car.add_new_car_to_space(start_point)
+        self.cars[car.shape] = car
+
+    def reset_cars(self, cars, start_point):
+        """Puts the bodies of cars that were already added back at the start at rest and adds them
+        to the space again in one call.
+
+        Args:
+            cars (list of Car obj): The cars to reset, none of which are in the space.
+            start_point (tuple): A tuple with x and y coords used to set the initial car location.
+        """
+        for car in cars:
+            body = car.body
+            body.position = start_point[0], start_point[1]
+            body.velocity = 0, 0
+            body.angle = 0
+            body.angular_velocity = 0
+            body.force = 0, 0
+            body.torque = 0
+
+            self.cars[car.shape] = car
+
+        if len(cars) > 0:
+            self.space.add(*[item for car in cars for item in (car.body, car.shape)])
+
+    @staticmethod
+    def touched_wall(arbiter, space, data):
+        """A handler that gets called when a car touches the wall. This marks the car as "dead"
+        (inactive) and queues it to be removed from the space.
+
+        Args:
+            arbiter (pymunk Arbiter abj): The Arbiter object encapsulates a pair of colliding shapes and all of
+                                    the data about their collision.
+            space (pymunk Space obj): Space describes the physics simulation space
+            data (dict): The cars by their shapes and the shapes of the cars that stopped.
+
+        Returns:
+            bool: Tells the pymunk to handle the collision normally
+        """
+        car = data["cars"].pop(arbiter.shapes[0], None)
+
+        if car is not None:
+            car.crash()
+            data["stopped"].append(arbiter.shapes[0])
+
+        return True
+
+    @staticmethod
+    def reached_finish(arbiter, space, data):
+        """A handler that gets called when a car reaches the finish line. This marks the car as finished
+        and queues it to be removed from the space.
+
+        Args:
+            arbiter (pymunk Arbiter abj): The Arbiter object encapsulates a pair of colliding shapes and all of
+                                    the data about their collision.
+            space (pymunk Space obj): Space describes the physics simulation space
+            data (dict): The cars by their shapes and the shapes of the cars that stopped.
+
+        Returns:
+            bool: Tells the pymunk to handle the collision normally
+        """
+        car = data["cars"].pop(arbiter.shapes[0], None)
+
+        if car is not None:
+            car.finish()
+            data["stopped"].append(arbiter.shapes[0])
+
+        return True
+
+    def step(self, timestep):
+        """Moves every car in the space forward in time, then removes the cars that stopped.
+
+        Args:
+            timestep (float): The time to step the space by.
+        """
+        self.space.step(timestep)
+
+        if len(self.stopped) > 0:
+            self.space.remove(*[item for shape in self.stopped for item in (shape.body, shape)])
+            self.stopped.clear()
+
+    def stop_car(self, car):
+        """Stops a car that is still moving where it is. It is removed from the space right away, outside
+        of a step, so that like a point mass it doesn't move any farther before it is scored.
+
+        Args:
+            car (Car obj): The car to stop.
+        """
+        if self.cars.pop(car.shape, None) is not None:
+            self.space.remove(car.body, car.shape)
+
+    def num_alive(self):
+        """Counts the cars that are still moving.
+
+        Returns:
+            int: The number of cars still moving in the space.
+        """
+        return len(self.cars)
+
+    def car_positions(self, cars):
+        """Gets the positions of cars.
+
+        Args:
+            cars (list of Car obj): The cars.
+
+        Returns:
+            ndarray: A (n, 2) array of the x and y of each car.
+        """
+        return np.array([(car.body.position.x, car.body.position.y) for car in cars]).reshape(-1, 2)
+
+    def remove_cars(self):
+        """Removes all of the car bodies from the space."""
+        shapes = list(self.cars) + self.stopped
+
+        if len(shapes) > 0:
+            self.space.remove(*[item for shape in shapes for item in (shape.body, shape)])
+
+        self.cars.clear()
+        self.stopped.clear()
+
+
+class PointMassPhysics:
+
+    def __init__(self, map_handler, mass=1):
+        """Simulates all of the cars as point masses whose positions and velocities are kept in
+        NumPy arrays and integrated in one batch. Cars never collide with each other, so the only
+        thing checked is whether a car crossed a wall or the finish line during a step.
+
+        Args:
+            map_handler (MapHandler obj): Object describing the map of the track.
+            mass (int, optional): The mass of every car. Defaults to 1.
+        """
+        self.map_handler = map_handler
+        self.mass = mass
+        self.cars = []
+
+        self.positions = np.zeros((0, 2))
+        self.velocities = np.zeros((0, 2))
+        self.forces = np.zeros((0, 2))
+        self.alive = np.zeros(0, dtype=bool)
+        self.finished = np.zeros(0, dtype=bool)
+
+        self.num_of_walls = -1
+        self.wall_starts = None
+        self.wall_ends = None
+        self.finish_starts, self.finish_ends = PointMassPhysics.segment_arrays(map_handler.finish_line_segments)
+
+    def add_car(self, car, start_point):
+        """Gives the car a body backed by a row of the physics arrays.
+
+        Args:
+            car (Car obj): The car to add.
+            start_point (tuple): A tuple with x and y coords used to set the initial car location.
+        """
+        index = len(self.cars)
+        self.cars.append(car)
+
+        if index == len(self.alive):
+            self._grow(max(1, 2 * index))
+
+        self.positions[index] = start_point[0], start_point[1]
+        self.velocities[index] = 0, 0
+        self.forces[index] = 0, 0
+        self.alive[index] = True
+        self.finished[index] = False
+
+        car.body = PointMassBody(self, index)
+
+    def reset_cars(self, cars, start_point):
+        """Puts cars that were already added back at the start at rest, reusing their bodies
+        and resetting the rows of the arrays in place.
+
+        Args:
+            cars (list of Car obj): The cars to reset.
+            start_point (tuple): A tuple with x and y coords used to set the initial car location.
+        """
+        num_of_cars = len(cars)
+        if num_of_cars > len(self.alive):
+            self._grow(num_of_cars)
+
+        self.cars = list(cars)
+        for index, car in enumerate(self.cars):
+            car.body.index = index
+
+        self.positions[:num_of_cars] = start_point[0], start_point[1]
+        self.velocities[:num_of_cars] = 0
+        self.forces[:num_of_cars] = 0
+        self.alive[:num_of_cars] = True
+        self.finished[:num_of_cars] = False
+
+    def _grow(self, capacity):
+        """Resizes the arrays to hold the given number of cars.
+
+        Args:
+            capacity (int): The new number of rows in the arrays.
+        """
+        num_of_cars = len(self.alive)
+
+        for name in ("positions", "velocities", "forces", "alive", "finished"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:num_of_cars] = old
+            setattr(self, name, new)
+
+    def step(self, timestep):
+        """Integrates the forces applied since the last step for every moving car, then stops the cars
+        that crossed a wall or the finish line on the way.
+
+        Args:
+            timestep (float): The time to step the cars by.
+        """
+        num_of_cars = len(self.cars)
+        moving = np.flatnonzero(self.alive[:num_of_cars])
+
+        if len(moving) > 0:
+            old_positions = self.positions[moving]
+
+            # The same semi-implicit Euler integration pymunk does, without gravity and damping
+            self.velocities[moving] += self.forces[moving] * (timestep / self.mass)
+            self.positions[moving] += self.velocities[moving] * timestep
+
+            new_positions = self.positions[moving]
+
+            self._refresh_walls()
+            finished = PointMassPhysics.crosses_any(old_positions, new_positions,
+                                                    self.finish_starts, self.finish_ends)
+            crashed = PointMassPhysics.crosses_any(old_positions, new_positions,
+                                                   self.wall_starts, self.wall_ends) & ~finished
+
+            # Cars stop where they were before the move, on the inner side of the line they crossed
+            stopped = finished | crashed
+            self.positions[moving[stopped]] = old_positions[stopped]
+
+            self.finished[moving[finished]] = True
+            for index in moving[finished]:
+                self.alive[index] = False
+                self.cars[index].finish()
+
+            for index in moving[crashed]:
+                self.alive[index] = False
+                self.cars[index].crash()
+
+        self.forces[:num_of_cars] = 0
+
+    def _refresh_walls(self):
+        """Rebuilds the wall arrays if walls were added to the map since the last step."""
+        if self.num_of_walls != len(self.map_handler.walls):
+            self.num_of_walls = len(self.map_handler.walls)
+            self.wall_starts, self.wall_ends = PointMassPhysics.segment_arrays(self.map_handler.walls)
+
+    def stop_car(self, car):
+        """Stops a car that is still moving where it is.
+
+        Args:
+            car (Car obj): The car to stop.
+        """
+        self.alive[car.body.index] = False
+
+    def num_alive(self):
+        """Counts the cars that are still moving.
+
+        Returns:
+            int: The number of cars still moving.
+        """
+        return int(np.count_nonzero(self.alive[:len(self.cars)]))
+
+    def num_finished(self):
+        """Counts the cars that reached the finish line.
+
+        Returns:
+            int: The number of cars that finished.
+        """
+        return int(np.count_nonzero(self.finished[:len(self.cars)]))
+
+    def car_positions(self, cars):
+        """Gets the positions of cars from the rows of their bodies.
+
+        Args:
+            cars (list of Car obj): The cars.
+
+        Returns:
+            ndarray: A (n, 2) array of the x and y of each car.
+        """
+        return self.positions[[car.body.index for car in cars]]
+
+    def remove_cars(self):
+        """Removes all of the cars from the simulation."""
+        self.alive[:] = False
+        self.cars = []
+
+    @staticmethod
+    def segment_arrays(segments):
+        """Converts pymunk segments to arrays of their end points.
+
+        Args:
+            segments (list of Segment obj): The segments to convert.
+
+        Returns:
+            ndarray: A (len(segments), 2) array of the first points of the segments.
+            ndarray: A (len(segments), 2) array of the second points of the segments.
+        """
+        starts = np.array([(seg.a.x, seg.a.y) for seg in segments], dtype=float).reshape(-1, 2)
+        ends = np.array([(seg.b.x, seg.b.y) for seg in segments], dtype=float).reshape(-1, 2)
+        return starts, ends
+
+    @staticmethod
+    def crosses_any(old_positions, new_positions, starts, ends):
+        """Checks which of the moves from the old to the new positions cross any of the given segments.
+
+        Args:
+            old_positions (ndarray): A (n, 2) array of positions before the move.
+            new_positions (ndarray): A (n, 2) array of positions after the move.
+            starts (ndarray): A (m, 2) array of the first points of the segments.
+            ends (ndarray): A (m, 2) array of the second points of the segments.
+
+        Returns:
+            ndarray: A (n,) bool array, True for the moves crossing a segment.
+        """
+        if len(starts) == 0:
+            return np.zeros(len(old_positions), dtype=bool)
+
+        # Solves old + t * move = start + u * seg for every move and segment pair
+        move = (new_positions - old_positions)[:, None, :]
+        seg = (ends - starts)[None, :, :]
+        to_start = starts[None, :, :] - old_positions[:, None, :]
+
+        denom = move[..., 0] * seg[..., 1] - move[..., 1] * seg[..., 0]
+        t_num = to_start[..., 0] * seg[..., 1] - to_start[..., 1] * seg[..., 0]
+        u_num = to_start[..., 0] * move[..., 1] - to_start[..., 1] * move[..., 0]
+
+        # Flip the signs so that the denominator is positive and no division is needed
+        sign = np.where(denom < 0, -1, 1)
+        denom, t_num, u_num = denom * sign, t_num * sign, u_num * sign
+
+        hits = (denom > 0) & (t_num >= 0) & (t_num <= denom) & (u_num >= 0) & (u_num <= denom)
+        return hits.any(axis=1)
+
+
+class PointMassBody:
+
+    def __init__(self, physics, index):
+        """Stands in for the pymunk Body of a car simulated by PointMassPhysics.
+
+        Args:
+            physics (PointMassPhysics obj): The physics holding the state of the car.
+            index (int): The row of the car in the physics arrays.
+        """
+        self.physics = physics
+        self.index = index
+
+    @property
+    def position(self):
+        return pymunk.Vec2d(*self.physics.positions[self.index])
+
+    @position.setter
+    def position(self, position):
+        self.physics.positions[self.index] = position[0], position[1]
+
+    @property
+    def velocity(self):
+        return pymunk.Vec2d(*self.physics.velocities[self.index])
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.physics.velocities[self.index] = velocity[0], velocity[1]
+
+    def velocity_at_world_point(self, point):
+        return self.velocity
+
+    def apply_force_at_world_point(self, force, point):
+        self.physics.forces[self.index] += force
+
+
+PHYSICS_BACKENDS = {
+    "pymunk": PymunkPhysics,
+    "point_mass": PointMassPhysics
+}
@@ -1,11 +1,19 @@
-import pymunk
+import numpy as np
 from cars import Car
-from random import randrange
+from dnas import CURRENT_CHECKPOINT, CURRENT_TICK, Dna
+from physics import PointMassPhysics, PymunkPhysics
+from profilers import NULL_PROFILER
+from selections import MatingPoolSelection
+
+# The most genes written by one batch of the reproduction, which bounds the memory of its index arrays
+REPRODUCTION_BATCH_GENES = 2 ** 20
 
 
 class Population:
 
-    def __init__(self, num_of_genes, map_handler, end_spread, mutation_rate, pop_size):
+    def __init__(self, num_of_genes, map_handler, end_spread, mutation_rate, pop_size, physics=None, genomes=None,
+                 selection=None, profiler=None, control_interval=1, interpolation="constant", rng=None,
+                 prefix_cache=None):
         """Sets up the object and creates the initial population of Car objects.
 
         Args:
@@ -14,9 +22,26 @@ class Population:
             end_spread (int): The number of genes to remove and replace from the end of the gene list.
             mutation_rate (float): The chance of the Dna to mutate.
             pop_size (int): The number of Cars in the population.
+            physics (PymunkPhysics or PointMassPhysics obj, optional): The physics backend moving the cars.
+                                                                      Defaults to pymunk in the map's space.
+            genomes (ndarray or list of ndarray, optional): The genes to create the cars from instead of pop_size
+                                                            random ones. Defaults to None.
+            selection (obj, optional): One of the strategies in selections.SELECTIONS used to pick the parents.
+                                       Defaults to a MatingPoolSelection.
+            profiler (Profiler obj, optional): The profiler to time the phases of the evolution with.
+                                               Defaults to not timing them.
+            control_interval (int, optional): The number of ticks between the control points that are the genes
+                                              of the Dna, 1 to have a gene for every tick. Defaults to 1.
+            interpolation (str, optional): How the force of the ticks between control points is found, one of
+                                           dnas.INTERPOLATIONS. Defaults to "constant".
+            rng (Generator obj, optional): The generator the reproduction draws from. Defaults to one seeded
+                                           from the global NumPy generator, so that seed_run still makes
+                                           runs reproducible.
+            prefix_cache (PrefixCache obj, optional): A cache of the states of cars at checkpoint boundaries,
+                                                      to resume children whose genes start the same way from.
+                                                      Defaults to simulating every car from the start.
         """
         self.population = []            # Array to hold the current population
-        self.mating_pool = []           # List which we will use for our "mating pool"
         self.generations = 0            # Number of generations
         self.finished = False           # Are we finished evolving?
 
@@ -24,65 +49,354 @@ class Population:
         self.mutation_rate = mutation_rate
         self.num_of_genes = num_of_genes
         self.end_spread = end_spread
+        self.control_interval = control_interval
+        self.interpolation = interpolation
+        self.num_of_points = Dna.count_points(num_of_genes, control_interval)
+        self.physics = physics if physics is not None else PymunkPhysics(map_handler)
+        self.selection = selection if selection is not None else MatingPoolSelection()
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.prefix_cache = prefix_cache
+
+        self.start_point = map_handler.start_point
+        num_of_cars = pop_size if genomes is None else len(genomes)
+
+        # The genes and path ranges of every car are rows of one matrix, which the Dna of the car are views
+        # of. The children of a generation are written into the spare genomes, which are then swapped in.
+        self.genomes = np.empty((num_of_cars, self.num_of_points, 2), dtype=np.float32)
+        self.spare_genomes = np.empty_like(self.genomes)
+        self.path_ranges = np.zeros((num_of_cars, len(map_handler.checkpoint_polys), 2), dtype=np.int32)
+        self.checkpoint_ticks = np.zeros((num_of_cars, len(map_handler.checkpoint_polys)), dtype=np.int32)
+        self.tracking = np.zeros((num_of_cars, 4), dtype=np.int64)
+
+        self.rng = rng if rng is not None else np.random.default_rng(np.random.randint(0, 2 ** 32, dtype=np.int64))
 
-        self.start_point = map_handler.find_line_midpoint(self.map_handler.starting_line)
+        # Creates the population of cars with random genes, unless the genes are given
+        if genomes is None:
+            self.genomes[:] = Dna.random_genes(num_of_cars * self.num_of_points, self.rng).reshape(self.genomes.shape)
+        else:
+            self.genomes[:] = genomes
 
-        # Creates the population of cars with random genes
-        for id in range(0, pop_size):
+        # The farthest along the track each car was found by retire_stalled during this generation
+        self.best_progresses = np.full(num_of_cars, -np.inf)
+
+        # The id of every car is its row in the matrices
+        for id in range(num_of_cars):
             self.population.append(
-                Car(self.map_handler, self.start_point, self.num_of_genes, self.end_spread, id))
+                Car(self.map_handler, self.start_point, self.num_of_genes, self.end_spread, id, self.new_dna(id),
+                    self.physics))
+
+    def new_dna(self, id):
+        """Creates a Dna with the gene count and encoding of the population, on a row of its matrices.
+
+        Args:
+            id (int): The id of the car the Dna is for.
+
+        Returns:
+            Dna obj: The Dna.
+        """
+        return Dna(self.map_handler.checkpoint_polys, self.num_of_genes, self.genomes[id], id=id,
+                   checkpoint_index=self.map_handler.checkpoint_index, control_interval=self.control_interval,
+                   interpolation=self.interpolation, path_ranges=self.path_ranges[id],
+                   checkpoint_ticks=self.checkpoint_ticks[id], tracking=self.tracking[id])
 
     def calculate_fitness(self):
-        """Calculates the fitness of each Car in the population."""
-        for car in self.population:
-            car.calculate_fitness()
+        """Calculates the fitness of each Car in the population in one batch."""
+        with self.profiler.phase("calculate_fitness"):
+            positions = np.array([(car.body.position.x, car.body.position.y) for car in self.population])
+            fitnesses = Dna.calculate_fitnesses(positions.reshape(-1, 2), self.map_handler.checkpoint_index)
 
-    def fitness_proportionate_selection(self):
-        """Fitness proportionate selection done over the entire population.
-        Creates a "mating pool" where the higher the fitness value of the Car, the
-        more entries in the pool it gets. This way, it gets better chances to get
-        picked when constructing new generation.
+            for car, fitness in zip(self.population, fitnesses):
+                car.dna.fitness = float(fitness)
+
+        self.profiler.count("checkpoint_lookups", len(positions))
+
+    def retire_stalled(self, min_progress):
+        """Stops the moving cars that have not got farther along the track since the last call.
+        Their fitness is calculated from where they stop, like for any other car.
+
+        Args:
+            min_progress (float): The part of a checkpoint a car has to cover beyond its best progress
+                                  so far to keep moving.
+
+        Returns:
+            int: The number of cars retired.
         """
+        moving = np.array([i for i, car in enumerate(self.population) if not car.is_dead], dtype=int)
+        if len(moving) == 0:
+            return 0
 
-        self.mating_pool = []
+        positions = np.array([(self.population[i].body.position.x, self.population[i].body.position.y)
+                              for i in moving])
+        progresses = Dna.calculate_progresses(positions, self.map_handler.checkpoint_index)
 
-        fitness_sum = 0
-        max_fitness = 0
-        for car in self.population:
-            fitness_sum += car.dna.fitness
-            if car.dna.fitness > max_fitness:
-                max_fitness = car.dna.fitness
+        stalled = moving[progresses < self.best_progresses[moving] + min_progress]
+        self.best_progresses[moving] = np.maximum(self.best_progresses[moving], progresses)
 
-        fitness_sum = fitness_sum / 100
+        for i in stalled:
+            self.population[i].stall()
+            self.physics.stop_car(self.population[i])
 
-        for car in self.population:
-            n = int(round(car.dna.fitness / fitness_sum))
+        return len(stalled)
 
-            # Create the mating pool where each car will get a number of entries corresponding their fitness
-            for x in range(0, n):
-                self.mating_pool.append(car.dna)
+    def select(self):
+        """Prepares the selection strategy with the fitness of the population, so that fitter
+        Cars get better chances to get picked when constructing new generation.
+        """
+        with self.profiler.phase("selection"):
+            self.selection.prepare(np.array([car.dna.fitness for car in self.population], dtype=float))
 
     def crossover(self):
-        """Constructs a new generation using the mating pool."""
+        """Constructs a new generation using the parents picked by the selection strategy. The genes of
+        all of the children are built by a few NumPy operations on the genome matrix per batch.
+        """
+
+        # Cars that survived the last generation are still in the space
+        self._stop_simulation()
+
+        # Pick two parents for every child at once
+        with self.profiler.phase("selection"):
+            parents = self.selection.sample(2 * len(self.population)).reshape(-1, 2)
+
+        # A child can only share the genes of a cached car up to a checkpoint boundary one of its parents crossed
+        if self.prefix_cache is not None:
+            boundary_ticks = np.concatenate((self.checkpoint_ticks[parents[:, 0]],
+                                             self.checkpoint_ticks[parents[:, 1]]), axis=1)
+
+        children = self.spare_genomes
+        mutated = np.empty(len(self.population), dtype=bool)
+        batch_size = max(1, REPRODUCTION_BATCH_GENES // self.num_of_points)
+
+        for start in range(0, len(self.population), batch_size):
+            batch = slice(start, start + batch_size)
+
+            # Every gene is random until it is overwritten by the genes taken from the parents
+            with self.profiler.phase("padding"):
+                Dna.fill_random_genes(children[batch], self.rng)
+
+            with self.profiler.phase("crossover"):
+                lengths = Dna.crossover_all(self.genomes, self.path_ranges, parents[batch], children[batch],
+                                            self.rng)
+
+            with self.profiler.phase("mutation"):
+                mutated[batch] = Dna.mutate_all(children[batch], lengths, self.mutation_rate, self.rng)
+
+        self.genomes, self.spare_genomes = children, self.genomes
 
-        # Refill the population with children from the mating pool
-        for i in range(len(self.population)):
-            # Pick two parents from the mating pool
-            a = randrange(0, len(self.mating_pool))
-            b = randrange(0, len(self.mating_pool))
+        # Refill the population with the children, reusing the cars, their Dna and their bodies
+        with self.profiler.phase("crossover"):
+            self.path_ranges[:] = 0
+            self.checkpoint_ticks[:] = 0
 
-            partnerA = self.mating_pool[a]
-            partnerB = self.mating_pool[b]
+            for car, genes, child_mutated in zip(self.population, self.genomes, mutated.tolist()):
+                car.dna.reset(genes, child_mutated)
+                car.reset(car.dna)
 
-            child = partnerA.crossover(partnerB, self.mutation_rate)
+        self.physics.reset_cars(self.population, self.start_point)
+        self.best_progresses[:] = -np.inf
 
-            # Create a new member of the population by overriding the old one
-            self.population[i] = \
-                Car(self.map_handler, self.start_point, self.num_of_genes,
-                    self.end_spread, self.population[i].id, child)
+        if self.prefix_cache is not None:
+            with self.profiler.phase("prefix_cache"):
+                self.resume_cars(boundary_ticks)
 
         self.generations += 1
 
+    def resume_cars(self, boundary_ticks):
+        """Resumes each car from the latest of the checkpoint boundaries its parents crossed, at which
+        the prefix cache has the state of a car with the same genes up to there.
+
+        Args:
+            boundary_ticks (ndarray): The (cars, n) ticks the parents of each car crossed a checkpoint
+                                      boundary on, or 0.
+        """
+        for car, ticks in zip(self.population, boundary_ticks):
+            ticks = np.unique(ticks[ticks > 0])[::-1].tolist()
+            if len(ticks) == 0:
+                continue
+
+            hashes = self.prefix_cache.prefix_hashes(car.dna.genes, car.dna.count_driving_points(ticks[0]))
+
+            for tick in ticks:
+                num_of_points = car.dna.count_driving_points(tick)
+                state = self.prefix_cache.get((tick, int(hashes[0, num_of_points - 1]),
+                                               int(hashes[1, num_of_points - 1])))
+
+                if state is not None:
+                    self.resume_car(car, state)
+                    break
+
+    def resume_car(self, car, state):
+        """Puts a car at the start of the generation in a state from the prefix cache.
+
+        Args:
+            car (Car obj): The car to resume.
+            state (tuple): The position, velocity, tick, checkpoint, last tracked gene, path ranges and
+                           checkpoint ticks cached by cache_car.
+        """
+        position, velocity, tick, checkpoint, last_tracked_gene, path_ranges, checkpoint_ticks = state
+
+        car.body.position = position
+        car.body.velocity = velocity
+        car.dna.resume(tick, checkpoint, last_tracked_gene, path_ranges, checkpoint_ticks)
+
+        # The force of the last tick read was applied after the step the state was cached on
+        car.apply_force(car.dna.force_at(tick - 1))
+
+        self.prefix_cache.hits += 1
+        self.prefix_cache.ticks_resumed += tick
+
+        self.profiler.count("prefix_cache_hits")
+        self.profiler.count("ticks_resumed", tick)
+
+    def cache_car(self, car):
+        """Caches the state of a car that just crossed a checkpoint boundary, keyed by the tick and the
+        genes that drove it there.
+
+        Args:
+            car (Car obj): The car to cache the state of.
+        """
+        dna = car.dna
+        tick = dna.current_tick
+        key = (tick,) + self.prefix_cache.prefix_hash(dna.genes, dna.count_driving_points(tick))
+
+        if key not in self.prefix_cache:
+            checkpoint = dna.farthest_poly_reached
+            position = car.body.position
+            velocity = car.body.velocity
+
+            self.prefix_cache.put(key, ((position.x, position.y), (velocity.x, velocity.y), tick, checkpoint,
+                                        dna.last_tracked_gene, dna.path_ranges[:checkpoint + 1].copy(),
+                                        dna.checkpoint_ticks[:checkpoint + 1].copy()))
+
+    def simulate_in_parallel(self, executor, num_of_shards, timestep, stall_window=0, min_progress=0):
+        """Splits the cars into shards and simulates a whole generation of each shard in the worker
+        processes of the executor, then copies the results back to the cars of the population.
+        The workers have to be initialised with simulators.init_worker.
+
+        Args:
+            executor (ProcessPoolExecutor obj): The executor to run the shards in.
+            num_of_shards (int): The number of shards to split the cars into.
+            timestep (float): The physics timestep of a single tick.
+            stall_window (int, optional): The number of ticks between checks for cars that stopped making
+                                          progress, or 0 to not check. Defaults to 0.
+            min_progress (float, optional): The progress a car has to make in a stall window. Defaults to 0.
+
+        Returns:
+            int: The largest number of ticks any of the shards took.
+        """
+        # Imported here as the simulators module depends on this one
+        from simulators import simulate_shard
+
+        shards = [self.population[i::num_of_shards] for i in range(num_of_shards)]
+        shards = [shard for shard in shards if len(shard) > 0]
+
+        futures = [executor.submit(simulate_shard, self.genomes[i::num_of_shards],
+                                   self.num_of_genes, self.end_spread, timestep, stall_window, min_progress,
+                                   self.control_interval, self.interpolation)
+                   for i, shard in enumerate(shards)]
+
+        ticks = 0
+        for shard, future in zip(shards, futures):
+            shard_ticks, results = future.result()
+            ticks = max(ticks, shard_ticks)
+
+            for car, (pos, path_ranges, farthest_poly_reached, fitness, finished, stalled) in zip(shard, results):
+                car.body.position = pos
+                car.dna.path_ranges[:] = path_ranges
+                car.dna.farthest_poly_reached = farthest_poly_reached
+                car.dna.fitness = fitness
+                car.finished = finished
+                car.stalled = stalled
+                car.is_dead = True
+
+                if finished:
+                    self.finished = True
+
+        self._stop_simulation()
+
+        return ticks
+
+    def statistics(self):
+        """Summarises the scored population.
+
+        Returns:
+            dict: The best, mean and median fitness, the farthest checkpoint reached and the number of
+                  cars that finished and of Dna that mutated.
+        """
+        fitnesses = np.array([car.dna.fitness for car in self.population], dtype=float)
+
+        return {
+            "best_fitness": float(fitnesses.max()),
+            "mean_fitness": float(fitnesses.mean()),
+            "median_fitness": float(np.median(fitnesses)),
+            "farthest_checkpoint": max(car.dna.farthest_poly_reached for car in self.population),
+            "cars_finished": sum(car.finished for car in self.population),
+            "mutations": sum(car.dna.mutated for car in self.population)
+        }
+
+    def best_dnas(self, num_of_dnas):
+        """Finds the Dna of the most fit members of the population.
+
+        Args:
+            num_of_dnas (int): The number of Dna objects to return.
+
+        Returns:
+            list of Dna obj: The Dna objects sorted from the most fit.
+        """
+        dnas = sorted((car.dna for car in self.population), key=lambda dna: dna.fitness, reverse=True)
+        return dnas[:num_of_dnas]
+
+    def replace_worst(self, migrants):
+        """Replaces the Dna of the least fit members of the population with Dna from elsewhere.
+
+        Args:
+            migrants (list of tuple): The genes, path ranges, farthest checkpoint and fitness of each new Dna.
+        """
+        worst_cars = sorted(self.population, key=lambda car: car.dna.fitness)
+
+        for car, migrant in zip(worst_cars, migrants):
+            self.set_dna(car, *migrant)
+
+    def set_dna(self, car, genes, path_ranges, farthest_poly_reached, fitness, mutated=False):
+        """Writes a Dna that has already been driven and scored into the Dna of the car.
+
+        Args:
+            car (Car obj): The car to give the Dna to.
+            genes (ndarray): The genes of the Dna.
+            path_ranges (ndarray): The (C, 2) int32 range of the genes used in each checkpoint.
+            farthest_poly_reached (int): The farthest checkpoint reached.
+            fitness (float): The fitness of the Dna.
+            mutated (bool, optional): Whether the Dna mutated. Defaults to False.
+        """
+        self.genomes[car.id] = genes
+
+        dna = car.dna
+        dna.reset(self.genomes[car.id], mutated)
+        dna.path_ranges[:] = path_ranges
+        dna.farthest_poly_reached = farthest_poly_reached
+        dna.fitness = fitness
+
+    def set_dnas(self, genomes, path_ranges, farthest_polys_reached, fitnesses, mutated):
+        """Writes the Dna of every car at once, like set_dna does for one car.
+
+        Args:
+            genomes (ndarray): A (P, num_of_points, 2) array of the genes of every car.
+            path_ranges (ndarray): A (P, C, 2) array of the range of the genes used in each checkpoint.
+            farthest_polys_reached (ndarray): The farthest checkpoint reached by each car.
+            fitnesses (ndarray): The fitness of each car.
+            mutated (ndarray): Whether the Dna of each car mutated.
+        """
+        self.genomes[:] = genomes
+
+        for car, farthest_poly_reached, fitness, car_mutated in zip(self.population, farthest_polys_reached.tolist(),
+                                                                    fitnesses.tolist(), mutated.tolist()):
+            dna = car.dna
+            dna.reset(self.genomes[car.id], car_mutated)
+            dna.farthest_poly_reached = farthest_poly_reached
+            dna.fitness = fitness
+
+        # Resetting the Dna clears the path ranges, so they are written last
+        self.path_ranges[:] = path_ranges
+
     def evaluate(self):
         """Computes the current "most fit" member of the population.
 
@@ -101,28 +415,112 @@ class Population:
 
         return pos
 
-    def move_and_draw_cars(self):
-        """Moves and draws each of the Cars in the population.
+    def move_cars(self):
+        """Moves each of the Cars in the population by their next gene, then tracks where all of the
+        moved cars got to in one batch.
 
         Returns:
             bool: Returns True if any of the cars finished.
         """
-        for car in self.population:
-            # Updated the car with the next gene vector
-            car.next_force()
+        with self.profiler.phase("next_force"):
+            moved = self.apply_next_genes()
+
+        # Stops the simulation if a car has finished the track
+        if moved is None:
+            self.finished = True
+            self._stop_simulation()
+            return self.finished
+
+        # Then note where the cars were moved to, which looks up the checkpoint of each of them
+        with self.profiler.phase("path_tracking"):
+            reached_new_checkpoint = self.track_paths(moved)
 
-            # Displays the car
-            car.display()
+            if self.prefix_cache is not None:
+                for id in moved[reached_new_checkpoint].tolist():
+                    self.cache_car(self.population[id])
 
-            # Stops the simulation if a car has finished the track
-            if not self.finished and car.finished:
-                self.finished = True
-                self._stop_simulation()
-                break
+        self.profiler.count("checkpoint_lookups", len(moved))
+
+        # Resumed cars run out of genes before the generation ends, and stop where the last one took them
+        if self.prefix_cache is not None:
+            for id in moved[self.tracking[moved, CURRENT_TICK] >= self.num_of_genes].tolist():
+                car = self.population[id]
+                car.run_out()
+                self.physics.stop_car(car)
 
         return self.finished
 
+    def apply_next_genes(self):
+        """Applies the next gene of every moving car as a force. The forces are read from the genome matrix
+        in one batch and the read cursors of the cars are moved together. Point mass cars get them written
+        straight into the force array of the physics, while pymunk bodies are pushed one at a time.
+
+        Returns:
+            ndarray: The ids of the cars that had a gene left to apply, or None if a car has finished the track.
+        """
+        point_mass = isinstance(self.physics, PointMassPhysics)
+
+        if point_mass:
+            if not self.finished and self.physics.num_finished() > 0:
+                return None
+
+            # The cars are the rows of the physics arrays in the order of their ids
+            moving = np.nonzero(self.physics.alive[:len(self.population)])[0]
+        else:
+            moving = []
+
+            for car in self.population:
+                if not car.is_dead:
+                    moving.append(car.id)
+
+                elif not self.finished and car.finished:
+                    return None
+
+            moving = np.array(moving, dtype=np.int64)
+
+        ticks = self.tracking[moving, CURRENT_TICK]
+        has_gene = ticks < self.num_of_genes
+        moved, ticks = moving[has_gene], ticks[has_gene]
+
+        forces = Dna.forces_at(self.genomes, moved, ticks, self.control_interval, self.interpolation)
+        self.tracking[moved, CURRENT_TICK] += 1
+
+        if point_mass:
+            self.physics.forces[moved] = forces
+        else:
+            for id, force in zip(moved.tolist(), forces.tolist()):
+                self.population[id].apply_force(force)
+
+        return moved
+
+    def track_paths(self, ids):
+        """Looks up the checkpoints of the cars that were just moved in one batch and adds the genes that
+        moved them to their path ranges, the same way track_path does for one car.
+
+        Args:
+            ids (ndarray): The ids of the cars that were moved.
+
+        Returns:
+            ndarray: Whether each of the cars got farther than the farthest checkpoint before.
+        """
+        if isinstance(self.physics, PointMassPhysics):
+            positions = self.physics.positions[ids]
+        else:
+            positions = self.physics.car_positions([self.population[id] for id in ids.tolist()])
+
+        checkpoints = self.map_handler.checkpoint_index.find_all(np.trunc(positions),
+                                                                 self.tracking[ids, CURRENT_CHECKPOINT])
+
+        return Dna.add_to_path_ranges_all(self.path_ranges, self.checkpoint_ticks, self.tracking, ids, checkpoints,
+                                          self.control_interval)
+
+    def all_dead(self):
+        """Checks if none of the Cars are left moving in the physics simulation.
+
+        Returns:
+            bool: True if every car has stopped.
+        """
+        return self.physics.num_alive() == 0
+
     def _stop_simulation(self):
-        for body in self.map_handler.space.bodies:
-            if body.body_type == pymunk.Body.DYNAMIC:
-                self.map_handler.space.remove(body)
+        self.physics.remove_cars()
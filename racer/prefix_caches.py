@@ -0,0 +1,135 @@
+from collections import OrderedDict
+import numpy as np
+
+# The bytes an entry takes besides its arrays, an estimate of the key, tuple and array headers
+ENTRY_OVERHEAD = 512
+
+# The odd bases of the two polynomial hashes of a genome prefix, which together make a 128 bit key
+HASH_BASES = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F)
+
+
+class PrefixCache:
+
+    def __init__(self, memory_budget):
+        """Keeps the state of cars at the checkpoint boundaries they crossed, keyed by the tick and a hash
+        of the genes that drove them there. The physics are deterministic, so a car with the same genes
+        up to that tick can be resumed from the state instead of simulated again from the start. The least
+        recently used states are evicted to keep the memory of the cache under its budget.
+
+        Args:
+            memory_budget (int): The most bytes the cached states can take.
+        """
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.entries = OrderedDict()
+
+        self.hits = 0                   # The number of cars resumed from the cache
+        self.ticks_resumed = 0          # The ticks those cars didn't have to simulate again
+
+        # The powers of the hash bases, grown to the longest genome hashed so far
+        self.powers = np.ones((len(HASH_BASES), 0), dtype=np.uint64)
+
+    def prefix_hashes(self, genes, num_of_points):
+        """Hashes every prefix of a genome up to a number of genes.
+
+        Args:
+            genes (ndarray): A (K, 2) float32 array of genes.
+            num_of_points (int): The length of the longest prefix to hash.
+
+        Returns:
+            ndarray: A (2, num_of_points) uint64 array, with the two hashes of the prefix of i + 1 genes
+                     in column i.
+        """
+        words = PrefixCache.gene_words(genes, num_of_points)
+
+        # Integer arrays wrap around on overflow, so this is the hash modulo 2 ** 64
+        return np.cumsum(words * self.get_powers(num_of_points), axis=1)
+
+    def prefix_hash(self, genes, num_of_points):
+        """Hashes one prefix of a genome, the same way prefix_hashes does.
+
+        Args:
+            genes (ndarray): A (K, 2) float32 array of genes.
+            num_of_points (int): The length of the prefix.
+
+        Returns:
+            tuple: The two hashes of the prefix.
+        """
+        words = PrefixCache.gene_words(genes, num_of_points)
+        hashes = (words * self.get_powers(num_of_points)).sum(axis=1)
+
+        return int(hashes[0]), int(hashes[1])
+
+    @staticmethod
+    def gene_words(genes, num_of_points):
+        """Reads each of the first genes of a genome as one 64 bit integer.
+
+        Args:
+            genes (ndarray): A (K, 2) float32 array of genes.
+            num_of_points (int): The number of genes to read.
+
+        Returns:
+            ndarray: The num_of_points uint64 words.
+        """
+        return np.ascontiguousarray(genes[:num_of_points], dtype=np.float32).view(np.uint64).ravel()
+
+    def get_powers(self, num_of_points):
+        """Gets the powers of the hash bases, computing more of them if needed.
+
+        Args:
+            num_of_points (int): The number of powers of each base.
+
+        Returns:
+            ndarray: A (2, num_of_points) uint64 array.
+        """
+        if num_of_points > self.powers.shape[1]:
+            factors = np.empty((len(HASH_BASES), num_of_points), dtype=np.uint64)
+            factors[:, 0] = 1
+            factors[:, 1:] = np.array(HASH_BASES, dtype=np.uint64)[:, None]
+            self.powers = np.cumprod(factors, axis=1)
+
+        return self.powers[:, :num_of_points]
+
+    def get(self, key):
+        """Looks a state up, marking it as the most recently used.
+
+        Args:
+            key (tuple): The tick and the two hashes of the genes that drove the car until it.
+
+        Returns:
+            tuple: The state, or None if it isn't cached.
+        """
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry[0]
+
+        return None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def put(self, key, state):
+        """Caches a state, evicting the least recently used ones if the cache is over its budget.
+
+        Args:
+            key (tuple): The tick and the two hashes of the genes that drove the car until it.
+            state (tuple): The state to cache. The size of its arrays is counted towards the budget.
+        """
+        size = ENTRY_OVERHEAD + sum(item.nbytes for item in state if isinstance(item, np.ndarray))
+
+        if key in self.entries or size > self.memory_budget:
+            return
+
+        self.entries[key] = (state, size)
+        self.memory_used += size
+
+        while self.memory_used > self.memory_budget:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.memory_used -= evicted_size
+
+    def clear(self):
+        """Forgets every state, for when the track changed."""
+        self.entries.clear()
+        self.memory_used = 0
@@ -0,0 +1,167 @@
+import contextlib
+import csv
+import json
+import math
+import time
+from bisect import bisect_left
+from collections import deque
+
+# The upper bounds of the buckets of the phase duration histograms, in seconds
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, math.inf)
+BUCKET_NAMES = ("1us", "10us", "100us", "1ms", "10ms", "100ms", "1s", "inf")
+
+
+class PhaseTimer:
+
+    def __init__(self):
+        """Times every run of one phase of the simulation with a context manager."""
+        self.start = 0
+        self.clear()
+
+    def clear(self):
+        """Forgets the runs timed so far."""
+        self.calls = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self.histogram = [0] * len(BUCKETS)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start
+
+        self.calls += 1
+        self.total += duration
+        self.longest = max(self.longest, duration)
+        self.histogram[bisect_left(BUCKETS, duration)] += 1
+
+        return False
+
+    def summary(self):
+        """Summarises the runs timed so far.
+
+        Returns:
+            dict: The number of runs, the total, mean and longest duration in seconds and the
+                  number of runs in each bucket of the histogram.
+        """
+        return {
+            "calls": self.calls,
+            "total": self.total,
+            "mean": self.total / self.calls if self.calls > 0 else 0.0,
+            "longest": self.longest,
+            "histogram": dict(zip(BUCKET_NAMES, self.histogram))
+        }
+
+
+class Profiler:
+
+    enabled = True
+
+    def __init__(self, keep_history=True):
+        """Times the phases of the simulation and counts what happened in them, keeping a
+        summary of every generation.
+
+        Args:
+            keep_history (bool, optional): Whether to keep the summary of every generation for a report, or
+                                           only the last one, so that the memory used doesn't grow with the
+                                           length of the run. Defaults to True.
+        """
+        # The summary of every generation ended so far, or of the last one
+        self.generations = [] if keep_history else deque(maxlen=1)
+        self.timers = {}
+        self.counters = {}
+
+    def phase(self, name):
+        """Gets the timer of a phase, to time a run of it with a with statement.
+
+        Args:
+            name (str): The name of the phase.
+
+        Returns:
+            PhaseTimer obj: The timer of the phase.
+        """
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer()
+
+        return timer
+
+    def count(self, name, amount=1):
+        """Adds to a counter of the current generation.
+
+        Args:
+            name (str): The name of the counter.
+            amount (int, optional): The amount to add. Defaults to 1.
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_generation(self, generation):
+        """Saves the timers and counters of a generation and starts them again for the next one.
+
+        Args:
+            generation (int): The number of the generation that ended.
+        """
+        self.generations.append({
+            "generation": generation,
+            "phases": {name: timer.summary() for name, timer in self.timers.items() if timer.calls > 0},
+            "counters": dict(self.counters)
+        })
+
+        for timer in self.timers.values():
+            timer.clear()
+        self.counters.clear()
+
+    def save(self, file):
+        """Writes the summaries of the generations to a JSON file, or to a CSV file with one row
+        per phase and counter of every generation if the file name ends with .csv.
+
+        Args:
+            file (str): The location and name of the report file.
+        """
+        if file.endswith(".csv"):
+            with open(file, "w", newline="") as report:
+                writer = csv.writer(report)
+                writer.writerow(["generation", "kind", "name", "calls", "total", "mean", "longest"] +
+                                ["under_" + bucket for bucket in BUCKET_NAMES])
+
+                for summary in self.generations:
+                    for name, timer in summary["phases"].items():
+                        writer.writerow([summary["generation"], "phase", name, timer["calls"], timer["total"],
+                                         timer["mean"], timer["longest"]] + list(timer["histogram"].values()))
+
+                    for name, value in summary["counters"].items():
+                        writer.writerow([summary["generation"], "counter", name, value] + [""] * (3 + len(BUCKETS)))
+        else:
+            with open(file, "w") as report:
+                json.dump({"buckets": dict(zip(BUCKET_NAMES, BUCKETS[:-1] + (None,))),
+                           "generations": list(self.generations)}, report, indent=2)
+
+
+class NullProfiler:
+
+    enabled = False
+
+    # The same do-nothing context manager is handed out for every phase
+    null_phase = contextlib.nullcontext()
+
+    def __init__(self):
+        """Stands in for a Profiler when profiling is off, at the cost of a method call per phase."""
+        self.generations = []
+
+    def phase(self, name):
+        return self.null_phase
+
+    def count(self, name, amount=1):
+        pass
+
+    def end_generation(self, generation):
+        pass
+
+    def save(self, file):
+        pass
+
+
+# Shared by everything that isn't given a profiler
+NULL_PROFILER = NullProfiler()
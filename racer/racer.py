@@ -1,15 +1,25 @@
 import pymunk as pm
 import datetime
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dnas import INTERPOLATIONS
+from islands import SocketChannel, run_island, run_islands
 from map_handlers import MapHandler
-from p5 import *
+from physics import PHYSICS_BACKENDS
 from populations import Population
+from prefix_caches import PrefixCache
+from profilers import Profiler
+from telemetry_writers import TelemetryWriter
+from trajectories import TrajectoryRecorder
+from selections import SELECTIONS
+from simulators import Simulator, init_worker
+from snapshots import load_snapshot, seed_run
 
 space = None
 ctrl_key_pressed = False  # l for now
 pop = None
-NUM_OF_GENES = 1500
-life_counter = 0
+simulator = None
+renderer = None
 display_checkpoint_polys = False
 map_handler = None
 start_time = 0
@@ -20,6 +30,35 @@ finished = False
 mut_rate = 0.3
 pop_size = 20
 map_file = 'track.txt'
+num_of_genes = 1500
+end_spread = 50
+timestep = 1 / 100.0
+control_interval = 1
+interpolation = 'constant'
+headless = False
+physics_backend = 'pymunk'
+selection_strategy = 'pool'
+num_of_workers = 0
+num_of_islands = 0
+migration_interval = 10
+num_of_migrants = 2
+island_mut_rates = []
+island_end_spreads = []
+island_transport = 'queue'
+island_addresses = None
+island_id = None
+seed = None
+snapshot_file = None
+snapshot_interval = 10
+resume_file = None
+stall_window = 0
+prefix_cache_size = 0
+ticks_per_frame = 1
+render_every = 1
+profile_file = None
+telemetry_file = None
+trajectory_file = None
+trajectory_cars = 5
 
 
 def parse_args():
@@ -32,6 +71,35 @@ def parse_args():
     global mut_rate
     global pop_size
     global map_file
+    global num_of_genes
+    global end_spread
+    global timestep
+    global control_interval
+    global interpolation
+    global headless
+    global physics_backend
+    global selection_strategy
+    global num_of_workers
+    global num_of_islands
+    global migration_interval
+    global num_of_migrants
+    global island_mut_rates
+    global island_end_spreads
+    global island_transport
+    global island_addresses
+    global island_id
+    global seed
+    global snapshot_file
+    global snapshot_interval
+    global resume_file
+    global stall_window
+    global prefix_cache_size
+    global ticks_per_frame
+    global render_every
+    global profile_file
+    global telemetry_file
+    global trajectory_file
+    global trajectory_cars
 
     parser = argparse.ArgumentParser()
 
@@ -41,15 +109,127 @@ def parse_args():
                         help="The population or the number of cars in the simulation.")
     parser.add_argument("-mf", "--map_file", type=str, default=map_file, metavar="String",
                         help="The location of the map.")
+    parser.add_argument("--num_of_genes", type=int, default=num_of_genes, metavar="Integer",
+                        help="The number of genes of every car, which is the most ticks a generation can take.")
+    parser.add_argument("--end_spread", type=int, default=end_spread, metavar="Integer",
+                        help="The number of genes to drop from the end of the path of a car that crashed.")
+    parser.add_argument("--timestep", type=float, default=timestep, metavar="Float",
+                        help="The physics timestep of a single tick in seconds.")
+    parser.add_argument("--control_interval", type=int, default=control_interval, metavar="Integer",
+                        help="The number of ticks between the control points that are the genes, 1 for a gene per tick.")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default=interpolation,
+                        help="How the force of the ticks between two control points is found.")
+    parser.add_argument("--headless", action="store_true",
+                        help="Run the evolution without a window until a car finishes the track.")
+    parser.add_argument("--physics", choices=PHYSICS_BACKENDS.keys(), default=physics_backend,
+                        help="The physics used to move the cars: a pymunk body per car, or NumPy point masses.")
+    parser.add_argument("--selection", choices=SELECTIONS.keys(), default=selection_strategy,
+                        help="How parents are picked: a mating pool, roulette wheel, alias table, tournament or rank.")
+    parser.add_argument("--workers", type=int, default=num_of_workers, metavar="Integer",
+                        help="The number of processes to split the cars between in headless mode.")
+    parser.add_argument("--islands", type=int, default=num_of_islands, metavar="Integer",
+                        help="The number of populations to evolve side by side in headless mode.")
+    parser.add_argument("--migration_interval", type=int, default=migration_interval, metavar="Integer",
+                        help="The number of generations between the islands exchanging their best Dna.")
+    parser.add_argument("--migrants", type=int, default=num_of_migrants, metavar="Integer",
+                        help="The number of best Dna each island sends to the next one.")
+    parser.add_argument("--island_mut_rates", type=float, nargs="+", default=island_mut_rates, metavar="Float",
+                        help="Mutation rates from 0 to 1 given to the islands in turn.")
+    parser.add_argument("--island_end_spreads", type=int, nargs="+", default=island_end_spreads,
+                        metavar="Integer", help="End spreads given to the islands in turn.")
+    parser.add_argument("--island_transport", choices=["queue", "tcp"], default=island_transport,
+                        help="Exchange the Dna through local queues or over TCP.")
+    parser.add_argument("--island_addresses", type=str, nargs="+", metavar="host:port",
+                        help="The address of every island for the TCP transport.")
+    parser.add_argument("--island_id", type=int, metavar="Integer",
+                        help="Run only this island of a TCP ring, so the islands can be on different machines.")
+
+    parser.add_argument("--seed", type=int, metavar="Integer",
+                        help="Seed the random generators to make a headless run reproducible.")
+    parser.add_argument("--snapshot", type=str, metavar="String",
+                        help="A file to save the state of the run to in headless mode.")
+    parser.add_argument("--snapshot_interval", type=int, default=snapshot_interval, metavar="Integer",
+                        help="The number of generations between snapshots.")
+    parser.add_argument("--resume", type=str, metavar="String",
+                        help="A snapshot file to continue a headless run from.")
+    parser.add_argument("--stall_window", type=int, default=stall_window, metavar="Integer",
+                        help="Retire cars that made no progress in this many ticks, 0 to never retire them.")
+    parser.add_argument("--prefix_cache", type=int, default=prefix_cache_size, metavar="Integer",
+                        help="The megabytes of car states to cache at checkpoint boundaries, so that children that "
+                             "start with the same genes as a cached car resume from it, 0 to not cache them.")
+    parser.add_argument("--ticks_per_frame", type=int, default=ticks_per_frame, metavar="Integer",
+                        help="The number of simulation ticks to run for every frame drawn.")
+    parser.add_argument("--render_every", type=int, default=render_every, metavar="Integer",
+                        help="Only draw every Nth generation, running the others without drawing them.")
+    parser.add_argument("--profile", type=str, metavar="String",
+                        help="A .json or .csv file to write the time spent in each phase of every generation to.")
+    parser.add_argument("--telemetry", type=str, metavar="String",
+                        help="A .jsonl file to append the statistics of every generation to as it ends.")
+    parser.add_argument("--trajectories", type=str, metavar="String",
+                        help="A file to append the paths of the best cars of every generation to, for replays.py.")
+    parser.add_argument("--trajectory_cars", type=int, default=trajectory_cars, metavar="Integer",
+                        help="The number of the best cars of every generation to record the paths of.")
 
     args = parser.parse_args()
 
     if args.mut_rate < 0 or args.mut_rate > 100:
         raise argparse.ArgumentTypeError(f"The number {args.mut_rate} is not in the range of [0-100].")
 
+    if args.control_interval < 1:
+        raise argparse.ArgumentTypeError("The control interval must be positive.")
+
+    if args.ticks_per_frame < 1 or args.render_every < 1:
+        raise argparse.ArgumentTypeError("The ticks per frame and the generations between drawn ones must be positive.")
+
+    if (args.workers > 0 or args.islands > 0) and not args.headless:
+        raise argparse.ArgumentTypeError("The workers and islands can only be used in headless mode.")
+
+    if args.island_addresses is not None and len(args.island_addresses) != args.islands:
+        raise argparse.ArgumentTypeError(f"There are {len(args.island_addresses)} island addresses, "
+                                         f"but {args.islands} islands.")
+
+    if args.island_id is not None:
+        if args.island_addresses is None:
+            raise argparse.ArgumentTypeError("An island of a TCP ring needs the --island_addresses of every island.")
+        if not 0 <= args.island_id < args.islands:
+            raise argparse.ArgumentTypeError(f"The island ID {args.island_id} is not in the range of "
+                                             f"[0-{args.islands - 1}].")
+
     mut_rate = args.mut_rate
     pop_size = args.pop_size
     map_file = args.map_file
+    num_of_genes = args.num_of_genes
+    end_spread = args.end_spread
+    timestep = args.timestep
+    control_interval = args.control_interval
+    interpolation = args.interpolation
+    headless = args.headless
+    physics_backend = args.physics
+    selection_strategy = args.selection
+    num_of_workers = args.workers
+    num_of_islands = args.islands
+    migration_interval = args.migration_interval
+    num_of_migrants = args.migrants
+    island_mut_rates = args.island_mut_rates
+    island_end_spreads = args.island_end_spreads
+    island_transport = args.island_transport
+    island_id = args.island_id
+    seed = args.seed
+    snapshot_file = args.snapshot
+    snapshot_interval = args.snapshot_interval
+    resume_file = args.resume
+    stall_window = args.stall_window
+    prefix_cache_size = args.prefix_cache
+    ticks_per_frame = args.ticks_per_frame
+    render_every = args.render_every
+    profile_file = args.profile
+    telemetry_file = args.telemetry
+    trajectory_file = args.trajectories
+    trajectory_cars = args.trajectory_cars
+
+    if args.island_addresses is not None:
+        island_addresses = [(host, int(port)) for host, port in
+                            (address.rsplit(":", 1) for address in args.island_addresses)]
 
     print(f"\nRunning with - \nPoplation size = {pop_size}" +
           f"\nMutation rate = {int(mut_rate * 100)}%\nTrack file = {map_file}")
@@ -58,58 +238,207 @@ def parse_args():
 def setup():
     """Overrides p5 setup() method. Sets up the map, physics nad population of cars."""
 
-    global space
-    global pop
     global start_time
-    global map_handler
+    global renderer
 
     # Set up the screen
     rect_mode('CENTER')
     size(1000, 800)
 
+    setup_simulation(threaded=True)
+    renderer = Renderer(map_handler)
+
+    start_time = datetime.datetime.now()
+
+
+def setup_simulation(threaded=False, executor=None):
+    """Sets up the physics space, the map and the population of cars.
+
+    Args:
+        threaded (bool, optional): Whether to step the physics space on two threads. Defaults to False.
+        executor (ProcessPoolExecutor obj, optional): An executor to simulate the generations in.
+                                                      Defaults to None.
+    """
+
+    global space
+    global pop
+    global simulator
+    global map_handler
+
     # Set up the physics space
-    space = pm.Space(threaded=True)
-    space.threads = 2
+    space = pm.Space(threaded=threaded)
+    if threaded:
+        space.threads = 2
 
     # Set up the map_handler for map-related calculations and drawing
     map_handler = MapHandler(space, map_file, 10)
 
     # Set up the population object to run the algorithm
-    pop = Population(NUM_OF_GENES, map_handler, 50, mut_rate, pop_size)
+    physics = PHYSICS_BACKENDS[physics_backend](map_handler)
+    # The telemetry records the phase timings of the last generation, which don't have to be kept for a report
+    if profile_file is not None:
+        profiler = Profiler()
+    elif telemetry_file is not None:
+        profiler = Profiler(keep_history=False)
+    else:
+        profiler = None
 
-    start_time = datetime.datetime.now()
+    # The workers simulate the cars of their shards from the start, and recorded paths have to start there too
+    prefix_cache = PrefixCache(prefix_cache_size * 2 ** 20) \
+        if prefix_cache_size > 0 and executor is None and trajectory_file is None else None
+
+    pop = Population(num_of_genes, map_handler, end_spread, mut_rate, pop_size, physics,
+                     selection=SELECTIONS[selection_strategy](), profiler=profiler, control_interval=control_interval,
+                     interpolation=interpolation, prefix_cache=prefix_cache)
+
+    telemetry = TelemetryWriter(telemetry_file) if telemetry_file is not None else None
+
+    # The workers don't send back the paths of their cars
+    recorder = None
+    if trajectory_file is not None and executor is None:
+        recorder = TrajectoryRecorder(trajectory_file, trajectory_cars,
+                                      metadata={"map_file": map_file, "start_finish_offset": 10, "timestep": timestep,
+                                                "physics": physics_backend, "pop_size": pop_size})
+
+    simulator = Simulator(pop, timestep, executor, num_of_workers, stall_window, telemetry=telemetry,
+                          recorder=recorder)
+
+
+def run_headless():
+    """Evolves the population without drawing anything until a car finishes the track."""
+
+    run_start_time = datetime.datetime.now()
+
+    if seed is not None:
+        seed_run(seed)
+
+    if num_of_workers > 0:
+        with ProcessPoolExecutor(num_of_workers, initializer=init_worker,
+                                 initargs=(map_file, 10, physics_backend)) as executor:
+            setup_simulation(executor=executor)
+            resume_and_run()
+    else:
+        setup_simulation()
+        resume_and_run()
+
+    time_taken = datetime.datetime.now() - run_start_time
+
+    print('Time taken to finish the track - ' + str(time_taken).split('.', 2)[0] +
+          ' Generations - ' + str(pop.generations))
+
+    if stall_window > 0:
+        print_ticks_saved()
+
+    if pop.prefix_cache is not None:
+        print_ticks_resumed()
+
+    close_reports()
+
+
+def print_ticks_saved():
+    """Prints how many ticks retiring the stalled cars saved in each generation."""
+
+    print('Ticks saved by retiring stalled cars - ' + str(simulator.total_ticks_saved) + ' of ' +
+          str(simulator.generations_scored * num_of_genes) + ', in the last generation - ' +
+          str(simulator.last_ticks_saved))
+
+
+def print_ticks_resumed():
+    """Prints how many cars were resumed from the prefix cache and the ticks that saved."""
+
+    prefix_cache = pop.prefix_cache
+    print('Cars resumed from the prefix cache - ' + str(prefix_cache.hits) + ', ticks not simulated again - ' +
+          str(prefix_cache.ticks_resumed) + ', cached states - ' + str(len(prefix_cache.entries)) + ' in ' +
+          str(round(prefix_cache.memory_used / 2 ** 20, 1)) + ' MB')
+
+
+def resume_and_run():
+    """Loads the snapshot to resume from, if one was given, and runs the simulation."""
+
+    if resume_file is not None:
+        load_snapshot(resume_file, pop)
+
+    simulator.run(snapshot_file=snapshot_file, snapshot_interval=snapshot_interval,
+                  resumed=resume_file is not None)
+
+
+def close_reports():
+    """Writes the profile of the run and the telemetry still queued, and closes the trajectory file,
+    if they were asked for.
+    """
+
+    if profile_file is not None:
+        simulator.profiler.save(profile_file)
+
+    if simulator.telemetry is not None:
+        simulator.telemetry.close()
+
+    if simulator.recorder is not None:
+        simulator.recorder.close()
+
+
+def run_headless_islands():
+    """Evolves several populations in separate processes until a car on any of them finishes the track."""
+
+    island_settings = []
+    for i in range(num_of_islands):
+        island_settings.append({
+            "map_file": map_file,
+            "start_finish_offset": 10,
+            "physics": physics_backend,
+            "selection": selection_strategy,
+            "num_of_genes": num_of_genes,
+            "end_spread": island_end_spreads[i % len(island_end_spreads)] if island_end_spreads else end_spread,
+            "mutation_rate": island_mut_rates[i % len(island_mut_rates)] if island_mut_rates else mut_rate,
+            "pop_size": pop_size,
+            "timestep": timestep,
+            "control_interval": control_interval,
+            "interpolation": interpolation,
+            "migration_interval": migration_interval,
+            "num_of_migrants": num_of_migrants,
+            "max_generations": None,
+            "stall_window": stall_window,
+            "seed": None if seed is None else seed + i
+        })
+
+    if island_id is None:
+        winner, finished, generations, seconds = run_islands(island_settings, island_transport, island_addresses)
+
+        print(f'Island {winner} finished the track first - Time taken ' +
+              str(datetime.timedelta(seconds=int(seconds))) + ' Generations - ' + str(generations))
+    else:
+        # The island only knows about itself, not whether another island of the ring finished before it
+        channel = SocketChannel(island_addresses[island_id], island_addresses[(island_id + 1) % num_of_islands])
+        island, finished, generations, seconds = run_island(island_id, island_settings[island_id], channel)
+
+        print(f'Island {island} finished the track after ' +
+              str(datetime.timedelta(seconds=int(seconds))) + ' Generations - ' + str(generations))
 
 
 def draw():
     """Overrides p5 draw() method. Is called every tick to draw the map and handle the cars."""
 
-    global life_counter
     global end_time
     global finished
 
-    # Check if the conditions for the end of an epoch are met, and if so, run the genetic algorithm
-    life_counter += 1
-    if (life_counter == NUM_OF_GENES or len(space.bodies) == map_handler.num_of_walls) and not finished:
-        life_counter = 0
-        pop.calculate_fitness()
-        pop.fitness_proportionate_selection()
-        map_handler.endpoints.append(pop.evaluate())
-        pop.crossover()
+    # Update the physics and move the cars
+    if not finished:
+        advance_simulation()
 
-    # Update the physics
-    space.step(1 / 100.0)
+    with simulator.profiler.phase("drawing"):
+        # Draw background
+        background(255)
 
-    # Draw background
-    background(255)
+        # Draw walls
+        renderer.draw_walls()
 
-    # Draw walls
-    map_handler.draw_walls()
+        # Draw endpoints (the n best positions reached so far)
+        renderer.draw_endpoints(5)
 
-    # Draw endpoints (the n best positions reached so far)
-    map_handler.draw_endpoints(5)
+        # Draw the cars
+        renderer.draw_cars(pop)
 
-    # Draw and update the cars
-    finished = pop.move_and_draw_cars()
+    finished = pop.finished
 
     # If finished, display info about the run (time and the number of generations it took)
     if finished:
@@ -117,6 +446,9 @@ def draw():
             end_time = datetime.datetime.now()
             time_taken = end_time - start_time
 
+            simulator.finish_run()
+            close_reports()
+
         text('Time taken to finish the track - ' + str(time_taken).split('.', 2)
              [0] + ' Generations - ' + str(pop.generations), ((width / 2) - 20, height / 2), 25)
 
@@ -126,7 +458,28 @@ def draw():
 
     # Draws black boxes to indicate checkpoints areas
     if display_checkpoint_polys:
-        map_handler.draw_checkpoint_polys()
+        with simulator.profiler.phase("drawing"):
+            renderer.draw_checkpoint_polys()
+
+
+def advance_simulation():
+    """Runs the ticks of one frame. Generations that are not drawn are run in full within the frame."""
+
+    for i in range(ticks_per_frame):
+        if pop.finished:
+            return
+
+        # Check if the conditions for the end of an epoch are met, and if so, run the genetic algorithm
+        if simulator.generation_over():
+            simulator.evolve()
+
+            while pop.generations % render_every != 0:
+                simulator.run_generation()
+                if pop.finished:
+                    return
+                simulator.evolve()
+
+        simulator.tick()
 
 
 def mouse_pressed():
@@ -154,6 +507,10 @@ def mouse_released():
         wall_to_add.append(wall_end_tpl)
         map_handler.add_wall(wall_to_add)
 
+        # The cached states were reached without the new wall
+        if pop.prefix_cache is not None:
+            pop.prefix_cache.clear()
+
         print(f"New wall added at coords: {wall_to_add[0]} - {wall_end_tpl}")
 
 
@@ -176,4 +533,14 @@ def key_pressed(event):
 
 if __name__ == "__main__":
     parse_args()
-    run()
+
+    if headless and num_of_islands > 0:
+        run_headless_islands()
+    elif headless:
+        run_headless()
+    else:
+        # p5 and its OpenGL stack are only loaded when there is a window to draw in
+        from p5 import *
+        from renderers import Renderer
+
+        run()
@@ -0,0 +1,185 @@
+from p5 import *
+
+
+class Renderer:
+
+    def __init__(self, map_handler):
+        """Draws the track and the cars with p5. This is the only module of the simulation that
+        imports p5, so that it is only loaded when there is a window to draw in.
+
+        Args:
+            map_handler (MapHandler obj): Object describing the map of the track.
+        """
+        self.map_handler = map_handler
+
+        # The shapes the static track is drawn with, built on the first frame they are drawn on
+        self.num_of_walls = -1
+        self.wall_shapes = []
+        self.checkpoint_shapes = None
+
+    def draw_walls(self):
+        """Draws the walls on the map. The walls are static, so the shapes of their segments are
+        only built again after a wall is added.
+        """
+
+        if self.num_of_walls != len(self.map_handler.walls):
+            self.num_of_walls = len(self.map_handler.walls)
+
+            fill(0)
+            self.wall_shapes = []
+
+            for wall_seg in self.map_handler.walls:
+                body = wall_seg.body
+                pv1 = body.position + wall_seg.a.rotated(body.angle)  # 1
+                pv2 = body.position + wall_seg.b.rotated(body.angle)
+                p1 = (int(pv1.x), int(pv1.y))
+                p2 = (int(pv2.x), int(pv2.y))
+
+                self.wall_shapes.append(PShape([p1, p2], attribs='path'))
+
+        for shape in self.wall_shapes:
+            draw_shape(shape)
+
+    def draw_checkpoint_polys(self):
+        """Draws the checkpoint polygons in shades of grey, from shapes that are built only once."""
+        if self.checkpoint_shapes is None:
+            checkpoint_polys = self.map_handler.checkpoint_polys
+            num_of_colours = int(255 / len(checkpoint_polys))
+            self.checkpoint_shapes = []
+
+            for index, poly in enumerate(checkpoint_polys):
+                poly_coords = list(poly.exterior.coords)
+
+                colour = Color(index * num_of_colours)
+                colour.alpha = 100
+
+                self.checkpoint_shapes.append(PShape([poly_coords[0], poly_coords[3], poly_coords[2], poly_coords[1]],
+                                                     fill_color=colour))
+
+        for shape in self.checkpoint_shapes:
+            draw_shape(shape)
+
+    def draw_endpoints(self, num_endpoints_to_draw):
+        """Draws a number of cirles indicating the furthest location the cars reached
+        over previous generations.
+
+        Args:
+            num_endpoints_to_draw (int): The number of endpoints to draw.
+        """
+        for point in list(self.map_handler.endpoints)[-num_endpoints_to_draw:]:
+            fill(255, 204, 0)
+            circle((point), 5)
+
+    def draw_cars(self, population):
+        """Draws each of the Cars in the population.
+
+        Args:
+            population (Population obj): The population to draw.
+        """
+        for car in population.population:
+            self.draw_car(car)
+
+    def draw_car(self, car):
+        """Draws a car as a triangle pointing the way it is moving, red if its Dna mutated.
+
+        Args:
+            car (Car obj): The car to draw.
+        """
+        pos = car.body.position
+        velocity = car.body.velocity_at_world_point(pos)
+        angle = velocity.angle + (PI * 1.5)
+
+        with push_matrix():
+            # Using the Vector position and float angle to translate and rotate the shape
+            translate(pos.x, pos.y)
+            rotate(angle)
+
+            if car.dna.mutated:
+                fill(255, 100, 100)
+            else:
+                fill(175)
+
+            triangle(car.points[0], car.points[1], car.points[2])
+
+
+class ReplayRenderer:
+
+    def __init__(self, compiled_map):
+        """Draws the track of a compiled map and recorded paths of cars with p5, without pymunk or
+        a population.
+
+        Args:
+            compiled_map (CompiledMap obj): The compiled map the paths were recorded on.
+        """
+        self.compiled_map = compiled_map
+
+        # The shapes of the static track and of the paths of the generation being replayed
+        self.wall_shapes = None
+        self.checkpoint_shapes = None
+        self.path_shapes = []
+
+    def draw_walls(self):
+        """Draws the walls of the map file, from shapes that are built only once."""
+        if self.wall_shapes is None:
+            wall_points = self.compiled_map.wall_points.astype(int).tolist()
+
+            fill(0)
+            self.wall_shapes = [PShape([tuple(wall_points[i]), tuple(wall_points[i + 1])], attribs='path')
+                                for i in range(0, len(wall_points), 2)]
+
+        for shape in self.wall_shapes:
+            draw_shape(shape)
+
+    def draw_checkpoint_polys(self):
+        """Draws the checkpoint quads in shades of grey, from shapes that are built only once."""
+        if self.checkpoint_shapes is None:
+            quads = self.compiled_map.quads.tolist()
+            num_of_colours = int(255 / max(len(quads), 1))
+            self.checkpoint_shapes = []
+
+            for index, quad in enumerate(quads):
+                colour = Color(index * num_of_colours)
+                colour.alpha = 100
+
+                self.checkpoint_shapes.append(PShape([tuple(corner) for corner in quad], fill_color=colour))
+
+        for shape in self.checkpoint_shapes:
+            draw_shape(shape)
+
+    def set_paths(self, paths):
+        """Builds the shapes of the paths of a generation.
+
+        Args:
+            paths (list of dict): The paths read by TrajectoryReader.read_generation.
+        """
+        self.path_shapes = [PShape([tuple(point) for point in path["positions"].tolist()],
+                                   stroke_color=Color(120, 160, 255), attribs='path') for path in paths]
+
+    def draw_paths(self, paths, tick):
+        """Draws the whole path of every car and the car where it was on a tick, gold for the fittest,
+        green if it finished and grey otherwise.
+
+        Args:
+            paths (list of dict): The paths read by TrajectoryReader.read_generation, from the fittest.
+            tick (int): The tick to draw the cars at. Cars that stopped before it are drawn where they stopped.
+        """
+        for shape in self.path_shapes:
+            draw_shape(shape)
+
+        for rank, path in reversed(list(enumerate(paths))):
+            positions = path["positions"]
+            index = min(tick, len(positions) - 1)
+            step = positions[index] - positions[max(index - 1, 0)]
+
+            with push_matrix():
+                translate(positions[index][0], positions[index][1])
+                rotate(atan2(step[1], step[0]) - HALF_PI)
+
+                if path["finished"]:
+                    fill(100, 200, 100)
+                elif rank == 0:
+                    fill(255, 204, 0)
+                else:
+                    fill(175)
+
+                triangle((-8, -8), (0, 8), (8, -8))
@@ -0,0 +1,161 @@
+"""Replays the paths of the best cars recorded with racer.py --trajectories, straight from the file,
+without pymunk or the genetic algorithm.
+
+Run from the root of the repository:
+
+    python racer/replays.py trajectories.bin
+    python racer/replays.py trajectories.bin --generation 40 --ticks_per_frame 4
+
+Press 'n' and 'p' to go to the next or previous recorded generation, 'r' to replay the current one
+from the start and 'c' to show the checkpoints.
+"""
+import argparse
+from map_compilers import compile_map
+from trajectories import TrajectoryReader
+
+reader = None
+compiled_map = None
+renderer = None
+generations = []
+generation_index = 0
+paths = []
+tick = 0
+display_checkpoint_polys = False
+
+# Default parameters
+trajectory_file = None
+map_file = None
+start_generation = None
+ticks_per_frame = 2
+
+
+def parse_args():
+    global trajectory_file
+    global map_file
+    global start_generation
+    global ticks_per_frame
+
+    parser = argparse.ArgumentParser(description="Replays the recorded paths of the best cars of each generation.")
+    parser.add_argument("trajectory_file", type=str, help="The file recorded with racer.py --trajectories.")
+    parser.add_argument("-g", "--generation", type=int, metavar="Integer",
+                        help="The generation to start from. Defaults to the last one recorded.")
+    parser.add_argument("-mf", "--map_file", type=str, metavar="String",
+                        help="The map the paths were recorded on. Defaults to the one noted in the file.")
+    parser.add_argument("--ticks_per_frame", type=int, default=ticks_per_frame, metavar="Integer",
+                        help="The number of recorded ticks to advance every frame.")
+
+    args = parser.parse_args()
+
+    if args.ticks_per_frame < 1:
+        raise argparse.ArgumentTypeError("The ticks per frame must be positive.")
+
+    trajectory_file = args.trajectory_file
+    map_file = args.map_file
+    start_generation = args.generation
+    ticks_per_frame = args.ticks_per_frame
+
+
+def load_generation(index):
+    """Reads the paths of a recorded generation and replays them from the start.
+
+    Args:
+        index (int): The index of the generation in the recorded generations.
+    """
+    global generation_index
+    global paths
+    global tick
+
+    generation_index = index
+    paths = reader.read_generation(generations[index])
+    tick = 0
+
+    renderer.set_paths(paths)
+
+
+def load_trajectories():
+    """Indexes the trajectory file and compiles the map it was recorded on.
+
+    Returns:
+        CompiledMap obj: The compiled map, or None if no generations were recorded.
+    """
+    global reader
+    global generations
+
+    reader = TrajectoryReader(trajectory_file)
+    generations = reader.generations
+
+    if len(generations) == 0:
+        print(f"No generations were recorded in {trajectory_file}")
+        return None
+
+    metadata = reader.metadata
+    return compile_map(map_file or metadata["map_file"], metadata.get("start_finish_offset", 10))
+
+
+def setup():
+    """Overrides p5 setup() method. Sets up the screen and the generation to start from."""
+
+    global renderer
+
+    rect_mode('CENTER')
+    size(1000, 800)
+
+    renderer = ReplayRenderer(compiled_map)
+
+    start = generations.index(start_generation) if start_generation in generations else len(generations) - 1
+    load_generation(start)
+
+
+def draw():
+    """Overrides p5 draw() method. Draws the track and the cars of the generation on the current tick."""
+
+    global tick
+
+    background(255)
+
+    renderer.draw_walls()
+
+    if display_checkpoint_polys:
+        renderer.draw_checkpoint_polys()
+
+    renderer.draw_paths(paths, tick)
+
+    longest = max(len(path["positions"]) for path in paths) if paths else 1
+    tick = min(tick + ticks_per_frame, longest - 1)
+
+    fill(0)
+    text(f"Generation {generations[generation_index]} - tick {tick} - best fitness {paths[0]['fitness']:.2f}"
+         if paths else f"Generation {generations[generation_index]}", (20, 20), 16)
+
+    title(f"Frame Rate: {frame_rate}")
+
+
+def key_pressed(event):
+    """Overrides p5 key_pressed() method. Moves between the recorded generations.
+
+    Args:
+        event (Event obj): Key pressed event object, specifying which key was clicked.
+    """
+    global tick
+    global display_checkpoint_polys
+
+    if event.key == 'N':
+        load_generation(min(generation_index + 1, len(generations) - 1))
+    elif event.key == 'P':
+        load_generation(max(generation_index - 1, 0))
+    elif event.key == 'R':
+        tick = 0
+    elif event.key == 'C':
+        display_checkpoint_polys = not display_checkpoint_polys
+
+
+if __name__ == "__main__":
+    parse_args()
+    compiled_map = load_trajectories()
+
+    if compiled_map is not None:
+        # p5 and its OpenGL stack are only loaded when there is a window to draw in
+        from p5 import *
+        from renderers import ReplayRenderer
+
+        run()
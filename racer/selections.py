@@ -0,0 +1,180 @@
+import numpy as np
+
+
+class MatingPoolSelection:
+
+    def prepare(self, fitnesses):
+        """Creates a "mating pool" where the higher the fitness value of the Car, the
+        more entries in the pool it gets. This way, it gets better chances to get
+        picked when constructing new generation.
+
+        Args:
+            fitnesses (ndarray): The fitness of each member of the population.
+        """
+        fitness_sum = fitnesses.sum() / 100
+
+        # Each car gets a number of entries corresponding their fitness
+        if fitness_sum > 0:
+            entries = np.rint(fitnesses / fitness_sum).astype(int)
+        else:
+            entries = np.zeros(len(fitnesses), dtype=int)
+
+        self.mating_pool = np.repeat(np.arange(len(fitnesses)), np.maximum(entries, 0))
+
+        # If no car earned an entry, everyone gets one
+        if len(self.mating_pool) == 0:
+            self.mating_pool = np.arange(len(fitnesses))
+
+    def sample(self, num_of_parents):
+        """Picks parents from the mating pool.
+
+        Args:
+            num_of_parents (int): The number of parents to pick.
+
+        Returns:
+            ndarray: The indices of the picked members of the population.
+        """
+        return self.mating_pool[np.random.randint(0, len(self.mating_pool), num_of_parents)]
+
+
+class RouletteSelection:
+
+    def prepare(self, fitnesses):
+        """Builds the cumulative sum of the fitnesses, so that a parent can be picked with a
+        chance proportionate to its fitness by a binary search.
+
+        Args:
+            fitnesses (ndarray): The fitness of each member of the population.
+        """
+        self.cumulative_fitness = np.cumsum(proportions(fitnesses))
+
+    def sample(self, num_of_parents):
+        """Picks parents with a chance proportionate to their fitness in O(log n) per parent.
+
+        Args:
+            num_of_parents (int): The number of parents to pick.
+
+        Returns:
+            ndarray: The indices of the picked members of the population.
+        """
+        spins = np.random.random(num_of_parents) * self.cumulative_fitness[-1]
+        parents = np.searchsorted(self.cumulative_fitness, spins, side="right")
+        return np.minimum(parents, len(self.cumulative_fitness) - 1)
+
+
+class AliasSelection:
+
+    def prepare(self, fitnesses):
+        """Builds the probability and alias tables of Vose's alias method, so that a parent can be
+        picked with a chance proportionate to its fitness in O(1).
+
+        Args:
+            fitnesses (ndarray): The fitness of each member of the population.
+        """
+        num_of_members = len(fitnesses)
+        weights = proportions(fitnesses)
+        scaled = weights * (num_of_members / weights.sum())
+
+        self.probabilities = np.ones(num_of_members)
+        self.aliases = np.arange(num_of_members)
+
+        small = [i for i in range(num_of_members) if scaled[i] < 1]
+        large = [i for i in range(num_of_members) if scaled[i] >= 1]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+
+            scaled[more] += scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def sample(self, num_of_parents):
+        """Picks parents with a chance proportionate to their fitness in O(1) per parent.
+
+        Args:
+            num_of_parents (int): The number of parents to pick.
+
+        Returns:
+            ndarray: The indices of the picked members of the population.
+        """
+        columns = np.random.randint(0, len(self.probabilities), num_of_parents)
+        keep = np.random.random(num_of_parents) < self.probabilities[columns]
+        return np.where(keep, columns, self.aliases[columns])
+
+
+class TournamentSelection:
+
+    def __init__(self, tournament_size=3):
+        """Picks the fittest of a few random members of the population as each parent.
+
+        Args:
+            tournament_size (int, optional): The number of members in each tournament. Defaults to 3.
+        """
+        self.tournament_size = tournament_size
+
+    def prepare(self, fitnesses):
+        """Keeps the fitnesses to compare the members of the tournaments by.
+
+        Args:
+            fitnesses (ndarray): The fitness of each member of the population.
+        """
+        self.fitnesses = fitnesses
+
+    def sample(self, num_of_parents):
+        """Runs a tournament for every parent in O(tournament_size) per parent.
+
+        Args:
+            num_of_parents (int): The number of parents to pick.
+
+        Returns:
+            ndarray: The indices of the picked members of the population.
+        """
+        entrants = np.random.randint(0, len(self.fitnesses), (num_of_parents, self.tournament_size))
+        winners = np.argmax(self.fitnesses[entrants], axis=1)
+        return entrants[np.arange(num_of_parents), winners]
+
+
+class RankSelection(RouletteSelection):
+
+    def prepare(self, fitnesses):
+        """Gives each member of the population a chance proportionate to its rank instead of its
+        fitness, so a few very fit members can't take over the whole next generation.
+
+        Args:
+            fitnesses (ndarray): The fitness of each member of the population.
+        """
+        ranks = np.empty(len(fitnesses))
+        ranks[np.argsort(fitnesses, kind="stable")] = np.arange(1, len(fitnesses) + 1)
+        super().prepare(ranks)
+
+
+def proportions(fitnesses):
+    """Turns fitnesses into non-negative weights, falling back to equal weights if all of them are zero.
+
+    Args:
+        fitnesses (ndarray): The fitness of each member of the population.
+
+    Returns:
+        ndarray: The weight of each member of the population.
+    """
+    weights = np.maximum(fitnesses, 0).astype(float)
+
+    if weights.sum() <= 0:
+        return np.ones(len(fitnesses))
+
+    return weights
+
+
+SELECTIONS = {
+    "pool": MatingPoolSelection,
+    "roulette": RouletteSelection,
+    "alias": AliasSelection,
+    "tournament": TournamentSelection,
+    "rank": RankSelection
+}
@@ -0,0 +1,271 @@
+import time
+import pymunk as pm
+from map_handlers import MapHandler
+from physics import PHYSICS_BACKENDS
+from populations import Population
+from snapshots import save_snapshot
+
+# The map and physics of a worker process, set up once by init_worker
+worker_map_handler = None
+worker_physics = None
+
+
+class Simulator:
+
+    def __init__(self, population, timestep=1 / 100.0, executor=None, num_of_shards=1, stall_window=0,
+                 min_progress=0.05, telemetry=None, recorder=None):
+        """Runs the evolution of a population without any drawing, so it can be
+        stepped as fast as the physics allows or driven frame by frame by a front-end.
+
+        Args:
+            population (Population obj): The population of cars to evolve.
+            timestep (float, optional): The physics timestep of a single tick. Defaults to 1 / 100.0.
+            executor (ProcessPoolExecutor obj, optional): An executor, initialised with init_worker, to simulate
+                                                          the generations in. Defaults to None.
+            num_of_shards (int, optional): The number of shards to split the cars into for the executor.
+                                           Defaults to 1.
+            stall_window (int, optional): The number of ticks a car gets to make progress before it is retired,
+                                          or 0 to let every car run until it crashes or runs out of genes.
+                                          Defaults to 0.
+            min_progress (float, optional): The part of a checkpoint a car has to cover in a stall window.
+                                            Defaults to 0.05.
+            telemetry (TelemetryWriter obj, optional): A writer to stream a record of every generation to.
+                                                       Defaults to None.
+            recorder (TrajectoryRecorder obj, optional): A recorder to append the paths of the best cars of every
+                                                         generation to. The cars simulated by the executor are not
+                                                         recorded. Defaults to None.
+        """
+        self.population = population
+        self.map_handler = population.map_handler
+        self.physics = population.physics
+        self.profiler = population.profiler
+        self.timestep = timestep
+        self.executor = executor
+        self.num_of_shards = num_of_shards
+        self.stall_window = stall_window
+        self.min_progress = min_progress
+        self.telemetry = telemetry
+        self.recorder = recorder
+        self.life_counter = 0
+        self.ticks_run = 0              # The ticks the last scored generation took
+        self.generations_scored = 0
+        self.total_ticks_saved = 0      # The ticks cut from the generations by retiring stalled cars
+        self.last_ticks_saved = 0       # The ticks cut from the last scored generation
+
+    def tick(self):
+        """Advances the simulation by one tick: steps the physics and applies the next gene of every car."""
+        with self.profiler.phase("physics_step"):
+            self.physics.step(self.timestep)
+
+        self.population.move_cars()
+        self.life_counter += 1
+
+        if self.recorder is not None:
+            with self.profiler.phase("recording"):
+                self.recorder.record_tick(self.population)
+
+        if self.profiler.enabled:
+            self.profiler.count("ticks")
+            self.profiler.count("cars_alive", self.physics.num_alive())
+
+        if self.stall_window > 0 and self.life_counter % self.stall_window == 0:
+            self.population.retire_stalled(self.min_progress)
+
+    def generation_over(self):
+        """Checks if the current generation has run out of genes or cars.
+
+        Returns:
+            bool: True if the genetic algorithm should be run.
+        """
+        return self.life_counter >= self.population.num_of_genes or self.population.all_dead()
+
+    def run_generation(self, deadline=None):
+        """Ticks the simulation until the current generation is over or a car has finished.
+
+        Args:
+            deadline (float, optional): The time.time() to stop ticking at, even if the generation isn't over.
+                                        The executor's generations are not cut short. Defaults to None.
+
+        Returns:
+            int: The number of ticks the generation took.
+        """
+        if self.executor is not None:
+            with self.profiler.phase("parallel_simulation"):
+                self.life_counter = self.population.simulate_in_parallel(self.executor, self.num_of_shards,
+                                                                         self.timestep, self.stall_window,
+                                                                         self.min_progress)
+
+            self.profiler.count("ticks", self.life_counter)
+            return self.life_counter
+
+        while not (self.population.finished or self.generation_over()):
+            self.tick()
+
+            if deadline is not None and time.time() >= deadline:
+                break
+
+        return self.life_counter
+
+    def evolve(self):
+        """Runs the genetic algorithm on the finished generation and starts the next one."""
+        self.score()
+        self.reproduce()
+
+    def score(self):
+        """Calculates the fitness of the finished generation."""
+        self.last_ticks_saved = self.count_ticks_saved()
+        self.total_ticks_saved += self.last_ticks_saved
+        self.generations_scored += 1
+        self.ticks_run = self.life_counter
+        self.life_counter = 0
+
+        # The workers have already calculated the fitness of the cars they simulated
+        if self.executor is None:
+            self.population.calculate_fitness()
+
+        if self.recorder is not None:
+            with self.profiler.phase("recording"):
+                self.recorder.end_generation(self.population.generations, self.population)
+
+    def count_ticks_saved(self):
+        """Counts the ticks the finished generation did not have to run because cars were retired as stalled.
+
+        Returns:
+            int: The genes left unused, if the generation ended early with stalled cars, otherwise 0.
+        """
+        if not self.population.finished and any(car.stalled for car in self.population.population):
+            return max(self.population.num_of_genes - self.life_counter, 0)
+
+        return 0
+
+    def reproduce(self):
+        """Selects the parents from the scored generation and breeds the next one."""
+        statistics = self.population.statistics() if self.telemetry is not None else None
+
+        self.population.select()
+        self.map_handler.endpoints.append(self.population.evaluate())
+        self.population.crossover()
+
+        self.end_generation(self.population.generations - 1, statistics)
+
+    def finish_run(self):
+        """Scores the generation the run stopped on, as it doesn't get to reproduce, and closes its
+        profile and telemetry record.
+        """
+        self.score()
+        self.end_generation(self.population.generations,
+                            self.population.statistics() if self.telemetry is not None else None)
+
+    def end_generation(self, generation, statistics):
+        """Closes the profile of a generation and streams its telemetry record.
+
+        Args:
+            generation (int): The number of the generation.
+            statistics (dict): The statistics of the population in the generation, or None without telemetry.
+        """
+        self.profiler.end_generation(generation)
+
+        if self.telemetry is not None:
+            record = {"generation": generation, "ticks": self.ticks_run,
+                      "ticks_saved": self.last_ticks_saved}
+            record.update(statistics)
+
+            if self.profiler.enabled:
+                record["phases"] = {name: timer["total"] for name, timer in
+                                    self.profiler.generations[-1]["phases"].items()}
+
+            self.telemetry.write(record)
+
+    def run(self, max_generations=None, snapshot_file=None, snapshot_interval=1, resumed=False, time_limit=None):
+        """Evolves the population until a car finishes the track.
+
+        Args:
+            max_generations (int, optional): The number of generations to give up after. Defaults to None.
+            snapshot_file (str, optional): A file to save the scored generations to. Defaults to None.
+            snapshot_interval (int, optional): The number of generations between snapshots. Defaults to 1.
+            resumed (bool, optional): Whether the current generation was loaded from a snapshot and
+                                      has already been simulated and scored. Defaults to False.
+            time_limit (float, optional): The number of seconds to give up after. It is checked on every tick,
+                                          so it also cuts a long generation short. Defaults to None.
+
+        Returns:
+            bool: True if a car has finished the track.
+        """
+        deadline = None if time_limit is None else time.time() + time_limit
+
+        while True:
+            if resumed:
+                resumed = False
+            else:
+                self.run_generation(deadline)
+
+                if self.population.finished:
+                    self.finish_run()
+                    return True
+
+                if max_generations is not None and self.population.generations >= max_generations:
+                    self.finish_run()
+                    return False
+
+                if deadline is not None and time.time() >= deadline:
+                    self.finish_run()
+                    return False
+
+                self.score()
+
+                if snapshot_file is not None and (self.population.generations + 1) % snapshot_interval == 0:
+                    save_snapshot(snapshot_file, self.population)
+
+            self.reproduce()
+
+
+def init_worker(map_file, start_finish_offset, physics_backend):
+    """Sets up the map and physics of a worker process that simulates shards of a population.
+
+    Args:
+        map_file (str): The location and name of the map file.
+        start_finish_offset (int): The offset of pixels the finish line is before the start line.
+        physics_backend (str): The name of the physics backend in PHYSICS_BACKENDS.
+    """
+    global worker_map_handler
+    global worker_physics
+
+    worker_map_handler = MapHandler(pm.Space(), map_file, start_finish_offset)
+    worker_physics = PHYSICS_BACKENDS[physics_backend](worker_map_handler)
+
+
+def simulate_shard(genomes, num_of_genes, end_spread, timestep, stall_window=0, min_progress=0, control_interval=1,
+                   interpolation="constant"):
+    """Simulates a whole generation of cars in the map and physics of the worker process.
+
+    Args:
+        genomes (list of ndarray): The genes of the cars to simulate.
+        num_of_genes (int): The number of genes per car.
+        end_spread (int): The number of genes to remove and replace from the end of the gene list.
+        timestep (float): The physics timestep of a single tick.
+        stall_window (int, optional): The number of ticks between checks for cars that stopped making progress,
+                                      or 0 to not check. Defaults to 0.
+        min_progress (float, optional): The progress a car has to make in a stall window. Defaults to 0.
+        control_interval (int, optional): The number of ticks between the control points of the genes.
+                                          Defaults to 1.
+        interpolation (str, optional): How the force between control points is found. Defaults to "constant".
+
+    Returns:
+        int: The number of ticks the generation took.
+        list of tuple: The final position, path ranges, farthest checkpoint, fitness, whether it finished and
+                       whether it stalled for each of the cars.
+    """
+    worker_physics.remove_cars()
+
+    population = Population(num_of_genes, worker_map_handler, end_spread, 0, len(genomes), worker_physics,
+                            genomes, control_interval=control_interval, interpolation=interpolation)
+    simulator = Simulator(population, timestep, stall_window=stall_window, min_progress=min_progress)
+    ticks = simulator.run_generation()
+    population.calculate_fitness()
+
+    results = []
+    for car in population.population:
+        results.append(((car.body.position.x, car.body.position.y), car.dna.path_ranges,
+                        car.dna.farthest_poly_reached, car.dna.fitness, car.finished, car.stalled))
+
+    return ticks, results
@@ -0,0 +1,130 @@
+import json
+import os
+import random
+import struct
+import zipfile
+import numpy as np
+
+# The size of the fixed part of the local header of a member of a zip file
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def seed_run(seed):
+    """Seeds every random generator used by the evolution, so that a headless run can be reproduced.
+
+    Args:
+        seed (int): The seed to use.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def save_snapshot(file, population):
+    """Saves the state of a simulated and scored generation to an uncompressed .npz file, so
+    that the run can be resumed from the selection of its parents.
+
+    Args:
+        file (str): The location and name of the snapshot file.
+        population (Population obj): The population to save.
+    """
+    dnas = [car.dna for car in population.population]
+
+    random_version, random_internal, random_gauss = random.getstate()
+    np_random_state = np.random.get_state()
+
+    state = {
+        "genomes": population.genomes,
+        "path_ranges": population.path_ranges,
+        "farthest_polys_reached": np.array([dna.farthest_poly_reached for dna in dnas], dtype=np.int32),
+        "fitnesses": np.array([dna.fitness for dna in dnas], dtype=float),
+        "mutated": np.array([dna.mutated for dna in dnas], dtype=bool),
+        "positions": np.array([(car.body.position.x, car.body.position.y) for car in population.population]),
+        "generations": np.array(population.generations),
+        "endpoints": np.array(population.map_handler.endpoints, dtype=float).reshape(-1, 2),
+        "random_version": np.array(random_version),
+        "random_internal": np.array(random_internal, dtype=np.int64),
+        "random_gauss": np.array(np.nan if random_gauss is None else random_gauss),
+        "np_random_keys": np_random_state[1],
+        "np_random_pos": np.array(np_random_state[2]),
+        "np_random_has_gauss": np.array(np_random_state[3]),
+        "np_random_gauss": np.array(np_random_state[4]),
+        "rng_state": np.array(json.dumps(population.rng.bit_generator.state))
+    }
+
+    # Written next to the file first, so that a crash can't leave a half written snapshot
+    temp_file = file + ".tmp"
+    with open(temp_file, "wb") as snapshot:
+        np.savez(snapshot, **state)
+    os.replace(temp_file, file)
+
+
+def load_snapshot(file, population):
+    """Restores a generation saved by save_snapshot into a population of the same size.
+
+    Args:
+        file (str): The location and name of the snapshot file.
+        population (Population obj): The population to restore the generation into.
+    """
+    state = load_arrays(file)
+
+    if len(state["genomes"]) != len(population.population):
+        raise ValueError(f"The snapshot has {len(state['genomes'])} cars, " +
+                         f"but the population has {len(population.population)}.")
+    if state["genomes"].shape[1] != population.num_of_points:
+        raise ValueError(f"The snapshot has {state['genomes'].shape[1]} genes per car, " +
+                         f"but the population has {population.num_of_points}.")
+
+    population.set_dnas(state["genomes"], state["path_ranges"], state["farthest_polys_reached"],
+                        state["fitnesses"], state["mutated"])
+
+    for car, position in zip(population.population, state["positions"].tolist()):
+        car.body.position = tuple(position)
+
+    population.generations = int(state["generations"])
+    population.map_handler.endpoints.clear()
+    population.map_handler.endpoints.extend(tuple(point) for point in state["endpoints"].tolist())
+
+    gauss = float(state["random_gauss"])
+    random.setstate((int(state["random_version"]), tuple(state["random_internal"].tolist()),
+                     None if np.isnan(gauss) else gauss))
+    np.random.set_state(("MT19937", np.array(state["np_random_keys"]), int(state["np_random_pos"]),
+                         int(state["np_random_has_gauss"]), float(state["np_random_gauss"])))
+    population.rng.bit_generator.state = json.loads(str(state["rng_state"]))
+
+
+def load_arrays(file):
+    """Reads every array of an .npz file once. The arrays of a member that is stored uncompressed,
+    as save_snapshot stores them, are memory-mapped where they are in the file instead of read.
+
+    Args:
+        file (str): The location and name of the .npz file.
+
+    Returns:
+        dict: The array of every member, by its name without the .npy extension.
+    """
+    arrays = {}
+
+    with zipfile.ZipFile(file) as archive, open(file, "rb") as npz:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+
+            if info.compress_type == zipfile.ZIP_STORED:
+                # The data of a member starts after its local header, whose extra field can differ from the central one
+                npz.seek(info.header_offset)
+                name_length, extra_length = struct.unpack("<HH", npz.read(ZIP_LOCAL_HEADER_SIZE)[26:30])
+                npz.seek(info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length)
+
+                version = np.lib.format.read_magic(npz)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else \
+                    np.lib.format.read_array_header_2_0
+                shape, fortran_order, dtype = read_header(npz)
+
+                if len(shape) > 0 and 0 not in shape and not dtype.hasobject:
+                    arrays[name] = np.memmap(file, dtype=dtype, mode="r", offset=npz.tell(), shape=shape,
+                                             order="F" if fortran_order else "C")
+                    continue
+
+            with archive.open(info) as member:
+                arrays[name] = np.lib.format.read_array(member)
+
+    return arrays
@@ -0,0 +1,238 @@
+"""Runs the racer headless over a grid or a random sample of hyperparameters and collects the
+generations and time each run took to finish the track into one CSV table.
+
+Run from the root of the repository:
+
+    python racer/sweeps.py --pop_sizes 20 50 --mut_rates 0.1 0.3 --seeds 0 1 2 --processes 4
+    python racer/sweeps.py --random 30 --end_spreads 25 50 100 --num_of_genes 1000 1500 --timeout 600
+"""
+import argparse
+import csv
+import itertools
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pymunk as pm
+from dnas import INTERPOLATIONS
+from map_handlers import MapHandler
+from physics import PHYSICS_BACKENDS
+from populations import Population
+from prefix_caches import PrefixCache
+from selections import SELECTIONS
+from simulators import Simulator
+from snapshots import seed_run
+
+# The hyperparameters swept over, in the order of the columns of the results table
+PARAMETERS = ("pop_size", "mutation_rate", "end_spread", "num_of_genes", "control_interval", "seed")
+
+RESULTS = ("finished", "timed_out", "generations", "seconds", "error")
+
+# The seconds after which a run gives up, unless another limit is given
+DEFAULT_TIME_LIMIT = 3600
+
+
+def grid_configs(space):
+    """Lists every combination of the values of the hyperparameters.
+
+    Args:
+        space (dict): The values to try for each name in PARAMETERS.
+
+    Returns:
+        list of dict: The value of each hyperparameter of every run.
+    """
+    return [dict(zip(PARAMETERS, values)) for values in itertools.product(*(space[name] for name in PARAMETERS))]
+
+
+def random_configs(space, num_of_runs, seed=None):
+    """Picks a random value for each hyperparameter of every run.
+
+    Args:
+        space (dict): The values to pick from for each name in PARAMETERS.
+        num_of_runs (int): The number of runs.
+        seed (int, optional): The seed of the picks, which doesn't affect the runs themselves. Defaults to None.
+
+    Returns:
+        list of dict: The value of each hyperparameter of every run.
+    """
+    picker = random.Random(seed)
+    return [{name: picker.choice(space[name]) for name in PARAMETERS} for i in range(num_of_runs)]
+
+
+def run_config(config, settings):
+    """Evolves a population with the given hyperparameters until a car finishes the track, or the
+    run reaches the generation or time limit.
+
+    Args:
+        config (dict): The value of each name in PARAMETERS.
+        settings (dict): The map_file, start_finish_offset, physics, selection, interpolation, timestep,
+                         stall_window, prefix_cache, max_generations and time_limit shared by every run.
+
+    Returns:
+        dict: The config with whether a car finished, whether the run timed out, the number of
+              generations and the seconds it took.
+    """
+    start_time = time.time()
+    seed_run(config["seed"])
+
+    map_handler = MapHandler(pm.Space(), settings["map_file"], settings["start_finish_offset"])
+    physics = PHYSICS_BACKENDS[settings["physics"]](map_handler)
+    prefix_cache = PrefixCache(settings["prefix_cache"] * 2 ** 20) if settings.get("prefix_cache") else None
+    population = Population(config["num_of_genes"], map_handler, config["end_spread"], config["mutation_rate"],
+                            config["pop_size"], physics, selection=SELECTIONS[settings["selection"]](),
+                            control_interval=config["control_interval"], interpolation=settings["interpolation"],
+                            prefix_cache=prefix_cache)
+    simulator = Simulator(population, settings["timestep"], stall_window=settings["stall_window"])
+
+    finished = simulator.run(max_generations=settings["max_generations"], time_limit=settings["time_limit"])
+    seconds = time.time() - start_time
+
+    timed_out = not finished and settings["time_limit"] is not None and seconds >= settings["time_limit"]
+
+    return dict(config, finished=finished, timed_out=timed_out, generations=population.generations,
+                seconds=round(seconds, 3), error="")
+
+
+def run_sweep(configs, settings, num_of_processes, output_file):
+    """Runs every config in a process pool, at most num_of_processes at a time, writing each result
+    to the CSV table as soon as its run is over. A run that raised an exception is written with the
+    error instead of its generations and seconds, and the other runs carry on.
+
+    Args:
+        configs (list of dict): The hyperparameters of every run.
+        settings (dict): The settings shared by every run, as taken by run_config.
+        num_of_processes (int): The number of runs to run at the same time.
+        output_file (str): The CSV file to write the results to.
+
+    Returns:
+        list of dict: The result of every run, in the order they ended.
+    """
+    results = []
+
+    with open(output_file, "w", newline="") as table, ProcessPoolExecutor(num_of_processes) as executor:
+        writer = csv.DictWriter(table, fieldnames=PARAMETERS + RESULTS)
+        writer.writeheader()
+
+        futures = {executor.submit(run_config, config, settings): config for config in configs}
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = dict(futures[future], finished=False, timed_out=False, generations=None, seconds=None,
+                              error=f"{type(error).__name__}: {error}")
+
+            results.append(result)
+
+            writer.writerow(result)
+            table.flush()
+
+            print(f"Run {len(results)}/{len(configs)} - " +
+                  ", ".join(f"{name} {result[name]}" for name in PARAMETERS + RESULTS if result[name] != ""))
+
+    return results
+
+
+def summarise(results):
+    """Prints the share of runs that finished and the mean generations and seconds of each
+    combination of hyperparameters, over its seeds. Runs that failed are only counted.
+
+    Args:
+        results (list of dict): The result of every run.
+    """
+    failed = [result for result in results if result["error"]]
+    if failed:
+        print(f"\n{len(failed)} of {len(results)} runs failed, see the error column of the table")
+
+    groups = {}
+    for result in results:
+        if result["error"]:
+            continue
+
+        groups.setdefault(tuple(result[name] for name in PARAMETERS[:-1]), []).append(result)
+
+    print("\n" + " ".join(f"{name:>13}" for name in PARAMETERS[:-1] + ("finished", "generations", "seconds")))
+
+    for values, group in sorted(groups.items(), key=lambda item: np.mean([r["generations"] for r in item[1]])):
+        finished = sum(result["finished"] for result in group)
+        generations = np.mean([result["generations"] for result in group])
+        seconds = np.mean([result["seconds"] for result in group])
+
+        print(" ".join(f"{value:>13}" for value in values) +
+              f" {finished:>6}/{len(group):<6} {generations:>13.1f} {seconds:>13.1f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sweeps the hyperparameters of the racer.")
+    parser.add_argument("--pop_sizes", type=int, nargs="+", default=[20], help="The population sizes to try.")
+    parser.add_argument("--mut_rates", type=float, nargs="+", default=[0.3],
+                        help="The mutation rates from 0 to 1 to try.")
+    parser.add_argument("--end_spreads", type=int, nargs="+", default=[50], help="The end spreads to try.")
+    parser.add_argument("--num_of_genes", type=int, nargs="+", default=[1500], help="The gene counts to try.")
+    parser.add_argument("--control_intervals", type=int, nargs="+", default=[1],
+                        help="The numbers of ticks between the control points of the genes to try.")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="The seeds to run every combination with.")
+    parser.add_argument("--random", type=int, metavar="Integer",
+                        help="Run this many random combinations instead of every combination.")
+    parser.add_argument("--search_seed", type=int, metavar="Integer",
+                        help="The seed of the random combinations.")
+    parser.add_argument("--processes", type=int, default=1, help="The number of runs to run at the same time.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIME_LIMIT, metavar="Float",
+                        help="The number of seconds after which a run gives up, even in the middle of a generation.")
+    parser.add_argument("--max_generations", type=int, metavar="Integer",
+                        help="The number of generations after which a run gives up.")
+    parser.add_argument("-mf", "--map_file", type=str, default="track.txt", help="The location of the map.")
+    parser.add_argument("--physics", choices=PHYSICS_BACKENDS.keys(), default="point_mass",
+                        help="The physics backend of the runs.")
+    parser.add_argument("--selection", choices=SELECTIONS.keys(), default="pool",
+                        help="The selection strategy of the runs.")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default="constant",
+                        help="How the force between two control points is found in every run.")
+    parser.add_argument("--timestep", type=float, default=1 / 100.0, help="The physics timestep of a tick.")
+    parser.add_argument("--stall_window", type=int, default=0,
+                        help="Retire cars that made no progress in this many ticks, 0 to never retire them.")
+    parser.add_argument("--prefix_cache", type=int, default=0,
+                        help="The megabytes of car states every run caches at checkpoint boundaries, 0 to not cache.")
+    parser.add_argument("--output", type=str, default="sweep_results.csv",
+                        help="The CSV file to write the result of every run to.")
+    args = parser.parse_args()
+
+    # Without a limit, a run that never finishes would hold its process forever
+    if args.timeout <= 0:
+        raise argparse.ArgumentTypeError("The timeout must be positive.")
+
+    return args
+
+
+def main():
+    args = parse_args()
+
+    space = {
+        "pop_size": args.pop_sizes,
+        "mutation_rate": args.mut_rates,
+        "end_spread": args.end_spreads,
+        "num_of_genes": args.num_of_genes,
+        "control_interval": args.control_intervals,
+        "seed": args.seeds
+    }
+    configs = grid_configs(space) if args.random is None else random_configs(space, args.random, args.search_seed)
+
+    settings = {
+        "map_file": args.map_file,
+        "start_finish_offset": 10,
+        "physics": args.physics,
+        "selection": args.selection,
+        "interpolation": args.interpolation,
+        "timestep": args.timestep,
+        "stall_window": args.stall_window,
+        "prefix_cache": args.prefix_cache,
+        "max_generations": args.max_generations,
+        "time_limit": args.timeout
+    }
+
+    results = run_sweep(configs, settings, args.processes, args.output)
+    summarise(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import json
+import queue
+import threading
+
+
+class TelemetryWriter:
+
+    def __init__(self, file, max_queued=256):
+        """Appends one JSON line per record to a file on a background thread, so that the simulation
+        doesn't wait for the disk. The queue of records waiting to be written is bounded, so the memory
+        used stays the same however long the run is.
+
+        Args:
+            file (str): The location and name of the JSONL file to append to.
+            max_queued (int, optional): The number of records that can wait to be written before
+                                        write blocks. Defaults to 256.
+        """
+        self.file = open(file, "a")
+        self.records = queue.Queue(max_queued)
+
+        self.thread = threading.Thread(target=self._write_records, daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        """Queues a record to be appended to the file.
+
+        Args:
+            record (dict): The record to write. It has to be serialisable to JSON.
+        """
+        self.records.put(record)
+
+    def close(self):
+        """Writes the records still queued and closes the file."""
+        self.records.put(None)
+        self.thread.join()
+
+    def _write_records(self):
+        while True:
+            record = self.records.get()
+            if record is None:
+                break
+
+            self.file.write(json.dumps(record) + "\n")
+
+            # Flushed whenever the writer catches up, so that a running sweep can be plotted
+            if self.records.empty():
+                self.file.flush()
+
+        self.file.close()
@@ -0,0 +1,245 @@
+import json
+import os
+import numpy as np
+
+# The first bytes of a trajectory file, followed by the length and JSON of its metadata
+MAGIC = b"RACERTRJ"
+FORMAT_VERSION = 1
+
+# The header of the record of a generation, followed by the size bytes of its cars
+GENERATION_HEADER = np.dtype([("generation", "<u4"), ("num_of_cars", "<u2"), ("num_of_ticks", "<u4"),
+                              ("size", "<u8")])
+
+# The header of the trajectory of a car, followed by its num_of_ticks (x, y) int16 deltas
+CAR_HEADER = np.dtype([("id", "<i4"), ("fitness", "<f8"), ("finished", "u1"), ("num_of_ticks", "<u4"),
+                       ("start", "<i4", (2,))])
+
+DELTA_LIMIT = np.iinfo(np.int16).max
+
+
+class TrajectoryRecorder:
+
+    def __init__(self, file, num_of_cars=5, scale=16, metadata=None):
+        """Records the positions of every car on every tick of a generation and appends the paths of
+        the best cars to a file once the generation is scored. In the file, a position is stored as the
+        int16 step from the one before it, in fixed point units of 1 / scale of a pixel, so a tick of a
+        car takes 4 bytes. While a generation runs, every car takes 8 bytes a tick in memory.
+
+        Args:
+            file (str): The location and name of the trajectory file to append to. A new file gets the
+                        metadata and scale, an existing one keeps its own.
+            num_of_cars (int, optional): The number of the best cars of each generation to keep.
+                                         Defaults to 5.
+            scale (int, optional): The number of fixed point units in a pixel. Defaults to 16.
+            metadata (dict, optional): Anything serialisable to JSON to describe the run with, such as
+                                       the map file. Defaults to None.
+        """
+        self.num_of_cars = num_of_cars
+
+        if os.path.exists(file) and os.path.getsize(file) > 0:
+            self.metadata = read_metadata(file)[0]
+        else:
+            self.metadata = dict(metadata or {}, scale=scale, version=FORMAT_VERSION)
+            write_metadata(file, self.metadata)
+
+        self.scale = self.metadata["scale"]
+        self.file = open(file, "ab")
+
+        self.moving = None              # Whether each car was still moving on the last tick
+        self.lengths = None             # The number of ticks each car moved for
+        self.positions = []             # A (cars, 2) float32 array of the positions of the cars on each tick
+
+    def to_fixed(self, positions):
+        """Converts positions to fixed point units.
+
+        Args:
+            positions (ndarray): An array of x and y positions in pixels.
+
+        Returns:
+            ndarray: An int64 array of the positions in fixed point units, of the same shape.
+        """
+        return np.round(np.asarray(positions, dtype=float) * self.scale).astype(np.int64)
+
+    def record_tick(self, population):
+        """Notes where every car of the population is after a tick.
+
+        Args:
+            population (Population obj): The population that was just moved.
+        """
+        cars = population.population
+
+        if self.moving is None:
+            self.moving = np.ones(len(cars), dtype=bool)
+            self.lengths = np.zeros(len(cars), dtype=np.int64)
+
+        # The steps are only encoded for the best cars once the generation is over
+        self.positions.append(population.physics.car_positions(cars).astype(np.float32))
+
+        # A car that stopped during the tick still moved to where it stopped
+        self.lengths[self.moving] = len(self.positions)
+        self.moving = np.array([not car.is_dead for car in cars])
+
+    def end_generation(self, generation, population):
+        """Appends the paths of the fittest cars of a scored generation to the file and starts
+        recording the next one.
+
+        Args:
+            generation (int): The number of the generation.
+            population (Population obj): The scored population.
+        """
+        if self.moving is None:
+            return
+
+        cars = population.population
+        fitnesses = np.array([car.dna.fitness for car in cars])
+        best = np.argsort(-fitnesses, kind="stable")[:self.num_of_cars]
+
+        # A (ticks + 1, best cars, 2) array of the positions of the best cars from the start, in fixed point
+        start = self.to_fixed([population.map_handler.start_point])[0]
+        fixed = np.empty((len(self.positions) + 1, len(best), 2), dtype=np.int64)
+        fixed[0] = start
+        fixed[1:] = self.to_fixed(np.array([tick[best] for tick in self.positions]).reshape(-1, len(best), 2))
+
+        steps = np.diff(fixed, axis=0)
+        if np.abs(steps).max(initial=0) > DELTA_LIMIT:
+            raise ValueError(f"A car moved more than {DELTA_LIMIT / self.scale} pixels in a tick, "
+                             f"record with a smaller scale than {self.scale}")
+
+        steps = steps.astype("<i2")
+
+        records = []
+        for rank, index in enumerate(best):
+            car = cars[index]
+            length = int(self.lengths[index])
+
+            header = np.zeros(1, dtype=CAR_HEADER)
+            header["id"] = car.id
+            header["fitness"] = car.dna.fitness
+            header["finished"] = car.finished
+            header["num_of_ticks"] = length
+            header["start"] = start
+
+            records.append(header.tobytes() + np.ascontiguousarray(steps[:length, rank]).tobytes())
+
+        body = b"".join(records)
+
+        generation_header = np.zeros(1, dtype=GENERATION_HEADER)
+        generation_header["generation"] = generation
+        generation_header["num_of_cars"] = len(records)
+        generation_header["num_of_ticks"] = len(self.positions)
+        generation_header["size"] = len(body)
+
+        # One write per generation, so a reader only ever misses the end of a record being written
+        self.file.write(generation_header.tobytes() + body)
+        self.file.flush()
+
+        self.moving = self.lengths = None
+        self.positions = []
+
+    def close(self):
+        """Closes the file."""
+        self.file.close()
+
+
+class TrajectoryReader:
+
+    def __init__(self, file):
+        """Indexes the generations of a trajectory file, so that any of them can be read without
+        reading the ones before it. A generation that was only partly written is left out.
+
+        Args:
+            file (str): The location and name of the trajectory file.
+        """
+        self.file = file
+        self.metadata, data_start = read_metadata(file)
+        self.scale = self.metadata["scale"]
+
+        # The offset of the cars of each generation, the latest record of a generation number wins
+        self.offsets = {}
+
+        file_size = os.path.getsize(file)
+        with open(file, "rb") as trajectories:
+            offset = data_start
+
+            while offset + GENERATION_HEADER.itemsize <= file_size:
+                trajectories.seek(offset)
+                header = np.frombuffer(trajectories.read(GENERATION_HEADER.itemsize), dtype=GENERATION_HEADER)[0]
+
+                end = offset + GENERATION_HEADER.itemsize + int(header["size"])
+                if end > file_size:
+                    break
+
+                self.offsets[int(header["generation"])] = (offset + GENERATION_HEADER.itemsize,
+                                                           int(header["num_of_cars"]))
+                offset = end
+
+    @property
+    def generations(self):
+        """The sorted numbers of the generations in the file."""
+        return sorted(self.offsets)
+
+    def read_generation(self, generation):
+        """Reads the paths of the best cars of a generation.
+
+        Args:
+            generation (int): The number of the generation.
+
+        Returns:
+            list of dict: The id, fitness, whether it finished and a (ticks + 1, 2) array of the positions
+                          in pixels from the start of each car, from the fittest.
+        """
+        offset, num_of_cars = self.offsets[generation]
+        paths = []
+
+        with open(self.file, "rb") as trajectories:
+            trajectories.seek(offset)
+
+            for i in range(num_of_cars):
+                header = np.frombuffer(trajectories.read(CAR_HEADER.itemsize), dtype=CAR_HEADER)[0]
+                num_of_ticks = int(header["num_of_ticks"])
+                deltas = np.frombuffer(trajectories.read(4 * num_of_ticks), dtype="<i2").reshape(-1, 2)
+
+                fixed = np.concatenate((header["start"][None].astype(np.int64),
+                                        header["start"] + np.cumsum(deltas, axis=0, dtype=np.int64)))
+
+                paths.append({"id": int(header["id"]), "fitness": float(header["fitness"]),
+                              "finished": bool(header["finished"]), "positions": fixed / self.scale})
+
+        return paths
+
+
+def write_metadata(file, metadata):
+    """Starts a trajectory file with the magic bytes and its metadata.
+
+    Args:
+        file (str): The location and name of the trajectory file.
+        metadata (dict): The metadata of the file.
+    """
+    encoded = json.dumps(metadata).encode()
+
+    with open(file, "wb") as trajectories:
+        trajectories.write(MAGIC + np.array([len(encoded)], dtype="<u4").tobytes() + encoded)
+
+
+def read_metadata(file):
+    """Reads the metadata a trajectory file starts with.
+
+    Args:
+        file (str): The location and name of the trajectory file.
+
+    Returns:
+        dict: The metadata of the file.
+        int: The offset of the first generation in the file.
+    """
+    with open(file, "rb") as trajectories:
+        if trajectories.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{file} is not a trajectory file")
+
+        length = int(np.frombuffer(trajectories.read(4), dtype="<u4")[0])
+        metadata = json.loads(trajectories.read(length).decode())
+
+    if metadata.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{file} was recorded in version {metadata.get('version')} of the trajectory format, "
+                         f"not {FORMAT_VERSION}")
+
+    return metadata, len(MAGIC) + 4 + length